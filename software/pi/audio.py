@@ -6,28 +6,125 @@ import logging
 import numpy as np
 from pathlib import Path
 from play_wav import play_wav
-from calibrate_and_detect import detect, calibrate
+from calibrate_and_detect import detection_events, calibrate, get_session, ECHO_GATE, SOFTWARE_DOA, SAMPLE_RATE, TARGET_FREQ, DOA_BAND, MIC_PROFILE, DETECT_CHANNEL
+from doa import DoaSampler, GccPhatDoa, MIC_CHANNELS
+from keyword_spotter import KeywordSpotter
+
+ANGLE_OFFSET = 163     # Mic array angle of the robot's front (XMOS DOAANGLE)
+# GCC-PHAT angles run counter-clockwise from the +x axis of the odas.cfg layout,
+# which shares neither zero nor sense with DOAANGLE. Until both are measured on
+# the robot the XMOS angle steers it and the GCC-PHAT angle is only logged next
+# to it: robot angle = (SOFTWARE_ANGLE_SIGN * GCC-PHAT angle + SOFTWARE_ANGLE_OFFSET) % 360
+SOFTWARE_ANGLE_OFFSET = None  # Degrees, not measured yet
+SOFTWARE_ANGLE_SIGN = None    # +1 or -1, not measured yet
+MIN_DOA_CONFIDENCE = 0.3     # Below this the XMOS estimate is used instead
+KEYWORD_SPOTTING = False  # Answer to a spoken "Polo" (Vosk) instead of the tone
+MAX_DOA_SPREAD = 30    # Degrees of spread above which the window angle is logged as unreliable
 
 logger = logging.getLogger(__name__)
 
-def get_doa_angle(threshold):
+_sampler = None
+_spotter = None
+_doa = GccPhatDoa(SAMPLE_RATE, freq_range=(TARGET_FREQ - DOA_BAND, TARGET_FREQ + DOA_BAND)) if SOFTWARE_DOA else None
+
+def software_doa_angle(event):
+    """Robot angle of a detection event from GCC-PHAT, or None if unavailable, unreliable or not oriented yet"""
+    frames = get_session().window(*event.window)
+    if frames is None or not len(frames):
+        return None
+    start = time.process_time()
+    angle, confidence = _doa.estimate(frames[:, MIC_CHANNELS])
+    logger.info(f"GCC-PHAT angle {angle:.0f}° (confidence {confidence:.2f}) "
+                f"in {(time.process_time() - start) * 1000:.1f} ms CPU")
+    if confidence < MIN_DOA_CONFIDENCE:
+        return None
+    if SOFTWARE_ANGLE_OFFSET is None or SOFTWARE_ANGLE_SIGN is None:
+        return None  # Orientation unknown, logged for measuring it
+    return (SOFTWARE_ANGLE_SIGN * angle + SOFTWARE_ANGLE_OFFSET) % 360
+
+def apply_mic_profile(tuning, name=MIC_PROFILE):
+    """Bring the mic array DSP to a known state, writing only the parameters that differ"""
+    start = time.monotonic()
+    try:
+        changed = tuning.apply_profile(name)
+    except (OSError, KeyError, ValueError) as e:  # USBError is an OSError
+        logger.warning(f"Could not apply mic profile {name}: {e}")
+        return
+    logger.info(f"Mic profile {name} applied in {(time.monotonic() - start) * 1000:.1f} ms, "
+                f"changed: {', '.join(changed) or 'nothing'}")
+
+def get_sampler():
+    """Shared background DOA sampler, started on first use; None without a mic array"""
+    global _sampler
+    if _sampler is None or not _sampler.running:
+        dev = usb.core.find(idVendor=0x2886, idProduct=0x0018)
+        if not dev:
+            return None
+        tuning = Tuning(dev)
+        apply_mic_profile(tuning)
+        _sampler = DoaSampler(tuning)
+        _sampler.start()
+    return _sampler
+
+def close_sampler():
+    global _sampler
+    if _sampler is not None:
+        _sampler.stop()
+        _sampler = None
+
+def get_spotter():
+    """Shared keyword spotter, its recognizer process started on first use"""
+    global _spotter
+    if _spotter is None:
+        _spotter = KeywordSpotter(get_session(), channel=DETECT_CHANNEL, echo_gate=ECHO_GATE)
+        _spotter.start()
+    return _spotter
+
+def close_spotter():
+    global _spotter
+    if _spotter is not None:
+        _spotter.stop()
+        _spotter = None
+
+def window_doa_angle(sampler, event):
+    """Circular mean of the XMOS angles polled while the event was heard"""
+    stats = sampler.stats(event.onset, event.decision)
+    if stats is None:
+        logger.warning("No DOA sample during the tone, using the latest one")
+        latest = sampler.latest()
+        return None if latest is None else latest[1]
+    mean, spread, n = stats
+    log = logger.warning if spread > MAX_DOA_SPREAD else logger.info
+    log(f"DOA over the tone: {mean:.0f}° ± {spread:.0f}° from {n} samples")
+    return mean
+
+def get_doa_angle(threshold, cancel=None):
+    """Listen until a tone is heard and return its angle; None if `cancel` is set first"""
     # Initialize hardware
-    dev = usb.core.find(idVendor=0x2886, idProduct=0x0018)
+    sampler = get_sampler()
 
-    if not dev:
+    if not sampler:
         logger.info("Mic array not found")
         return None
 
-    tuning = Tuning(dev)
-
     logger.info("Listening for wake word...")
     try:
-        while True:
-            if detect(threshold):
-                angle = (tuning.direction + 163) % 360
-                logger.info(f"Wake word detected! Angle: {angle}°")
-                play_wav("/home/hexapolo/project/hear.wav")
-                return angle
+        if KEYWORD_SPOTTING:
+            events = get_spotter().events(cancel=cancel)
+        else:
+            events = detection_events(threshold, cancel=cancel)
+        for event in events:
+            angle = software_doa_angle(event) if SOFTWARE_DOA else None
+            if angle is None:
+                angle = window_doa_angle(sampler, event)
+                if angle is None:
+                    continue
+                angle = (angle + ANGLE_OFFSET) % 360
+            logger.info(f"Wake word detected! Angle: {angle}°")
+            play_wav("/home/hexapolo/project/hear.wav", block=False)  # Turn while saying it
+            return angle
+        logger.info("Stopped listening")
+        return None
     except KeyboardInterrupt:
         logger.info("\nStopped by user")
         return -999
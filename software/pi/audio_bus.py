@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Shared-memory audio bus: one capture process, any number of reader processes.
+
+    python audio_bus.py [CHANNELS] [SAMPLE_RATE]    # run the capture process
+
+The capture process owns the device and writes every block into a ring
+buffer in multiprocessing.shared_memory. Consumers in other processes attach
+to it by name and read with their own cursor, so the detector, DOA, recorder
+and keyword spotter share one device handle and are not bound by one GIL.
+"""
+import sys
+import time
+import signal
+import logging
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from capture import make_backend, BUFFER_SECONDS, MAX_READ
+
+BUS_NAME = "hexapolo_audio"
+MAX_CONSUMERS = 8      # Consumer slots; each consumer uses a fixed id
+POLL_INTERVAL = 0.002  # Seconds between checks while a reader waits for audio
+STATS_INTERVAL = 10.0  # Seconds between consumer lag logs of the capture process
+
+# Header layout (int64 slots), followed by MAX_CONSUMERS x (active, position, overruns)
+WRITTEN, CAPACITY, CHANNELS, MAX_READ_SLOT, SAMPLE_RATE_SLOT, RUNNING, ANCHOR_TIME, ANCHOR_INDEX = range(8)
+HEADER_SLOTS = 8
+ACTIVE, POSITION, OVERRUNS = range(3)
+
+logger = logging.getLogger(__name__)
+
+
+class AudioBus:
+    """Lock-free single-producer / multi-consumer ring of int16 frames in shared memory.
+
+    The producer copies each block into the ring (the first max_read frames
+    are mirrored past the end like CaptureSession, so reads are views) and
+    only then advances the shared write counter. Readers never take a lock:
+    they compare their cursor with the counter to wait, to detect that the
+    producer lapped them (overrun), and to check after the fact that a view
+    they were handed was not overwritten while they used it.
+    """
+
+    def __init__(self, name=BUS_NAME, sample_rate=None, channels=1, buffer_seconds=BUFFER_SECONDS,
+                 max_read=MAX_READ, create=False):
+        self.name = name
+        header_bytes = 8 * (HEADER_SLOTS + 3 * MAX_CONSUMERS)
+        if create:
+            capacity = int(buffer_seconds * sample_rate)
+            size = header_bytes + 2 * (capacity + max_read) * channels
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Attaching registers the segment too, and the tracker would unlink it when this
+            # consumer exits (before Python 3.13's track=False); only the creator owns it
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+
+        self._header = np.ndarray(HEADER_SLOTS + 3 * MAX_CONSUMERS, dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[[CAPACITY, CHANNELS, MAX_READ_SLOT, SAMPLE_RATE_SLOT]] = (
+                capacity, channels, max_read, sample_rate)
+        self.capacity = int(self._header[CAPACITY])
+        self.channels = int(self._header[CHANNELS])
+        self.max_read = int(self._header[MAX_READ_SLOT])
+        self.sample_rate = int(self._header[SAMPLE_RATE_SLOT])
+        # Capture time of the newest block, as (ANCHOR_INDEX, ANCHOR_TIME) like CaptureSession._anchor
+        self._anchor_time = self._header[ANCHOR_TIME:ANCHOR_TIME + 1].view(np.float64)
+        self._consumers = self._header[HEADER_SLOTS:].reshape(MAX_CONSUMERS, 3)
+        self._ring = np.ndarray((self.capacity + self.max_read, self.channels), dtype=np.int16,
+                                buffer=self.shm.buf, offset=header_bytes)
+
+    # ----- producer side -----
+
+    def start(self):
+        self._anchor_time[0] = time.monotonic()
+        self._header[ANCHOR_INDEX] = self.written
+        self._header[RUNNING] = 1
+
+    def write(self, frames, stamp=None):
+        """Append one block (None marks the end of the stream); producer only.
+
+        `stamp` is the time.monotonic() its first frame was captured at, as
+        passed by the capture backends.
+        """
+        if frames is None:
+            self._header[RUNNING] = 0
+            return
+        n = len(frames)
+        if n > self.max_read:
+            raise ValueError(f"Blocks must be at most {self.max_read} frames")
+        written = int(self._header[WRITTEN])
+        if stamp is None:
+            stamp = time.monotonic() - n / self.sample_rate
+        # Readers retry while the index is -1, so they never pair a new time with an old index
+        self._header[ANCHOR_INDEX] = -1
+        self._anchor_time[0] = stamp
+        self._header[ANCHOR_INDEX] = written
+        pos = written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._ring[pos:pos + first] = frames[:first]
+        self._ring[:n - first] = frames[first:]
+        for lo, hi in ((pos, pos + first), (0, n - first)):
+            hi = min(hi, self.max_read)
+            if lo < hi:
+                self._ring[self.capacity + lo:self.capacity + hi] = self._ring[lo:hi]
+        # Publish only once the data is in place
+        self._header[WRITTEN] = written + n
+
+    # ----- consumer side -----
+
+    @property
+    def written(self):
+        return int(self._header[WRITTEN])
+
+    @property
+    def running(self):
+        return bool(self._header[RUNNING])
+
+    def sample_time(self, index):
+        """Approximate time.monotonic() at which sample `index` was captured"""
+        while True:
+            anchor_index = int(self._header[ANCHOR_INDEX])
+            anchor_time = float(self._anchor_time[0])
+            if anchor_index >= 0 and anchor_index == int(self._header[ANCHOR_INDEX]):
+                return anchor_time + (index - anchor_index) / self.sample_rate
+
+    def reader(self, consumer_id, preroll=0.0, channel=0):
+        """Attach consumer `consumer_id` (0..MAX_CONSUMERS-1), starting `preroll` seconds back"""
+        written = self.written
+        back = min(int(preroll * self.sample_rate), written, self.capacity - self.max_read)
+        slot = self._consumers[consumer_id]
+        slot[:] = (1, written - back, 0)
+        return BusReader(self, slot, channel)
+
+    def stats(self):
+        """{consumer id: (lag in frames, overruns)} of the attached consumers.
+
+        A consumer lapped since its last read counts one overrun more than its
+        slot holds, since read() only records it on the next call.
+        """
+        written = self.written
+        stats = {}
+        for i, slot in enumerate(self._consumers):
+            if slot[ACTIVE]:
+                lag = written - int(slot[POSITION])
+                stats[i] = (lag, int(slot[OVERRUNS]) + (lag >= self.capacity - self.max_read))
+        return stats
+
+    def close(self):
+        self._header = self._anchor_time = self._consumers = self._ring = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class BusReader:
+    """Independent cursor of one consumer, with the same read() interface as CaptureReader"""
+
+    def __init__(self, bus, slot, channel=0):
+        self.bus = bus
+        self._slot = slot
+        self.channel = channel
+        self.position = int(slot[POSITION])
+        self._view_start = None
+
+    def read(self, n, timeout=None):
+        """Wait until n frames are available and return them as a view into shared memory.
+
+        The view stays valid until the producer laps it; call valid() after
+        using it to make sure it was not overwritten meanwhile. Returns None
+        if the stream ended or the timeout expired first.
+        """
+        bus = self.bus
+        if n > bus.max_read:
+            raise ValueError(f"Cannot read more than {bus.max_read} frames at once")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while bus.written < self.position + n:
+            if not bus.running and bus.written < self.position + n:
+                return None
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_INTERVAL)
+
+        # Oldest frame that is safe from the block the producer may be writing now
+        oldest = bus.written + bus.max_read - bus.capacity
+        if self.position < oldest:
+            logger.warning(f"Audio bus reader overrun, skipped {oldest - self.position} samples")
+            self._slot[OVERRUNS] += 1
+            self.position = oldest
+
+        pos = self.position % bus.capacity
+        frames = bus._ring[pos:pos + n]
+        self._view_start = self.position
+        self.position += n
+        self._slot[POSITION] = self.position
+        return frames if self.channel is None else frames[:, self.channel]
+
+    def valid(self):
+        """Whether the last view returned by read() is still intact"""
+        return (self._view_start is not None and
+                self._view_start >= self.bus.written + self.bus.max_read - self.bus.capacity)
+
+    @property
+    def lag(self):
+        """Frames written but not yet read by this consumer"""
+        return self.bus.written - self.position
+
+    @property
+    def time(self):
+        return self.bus.sample_time(self.position)
+
+    def close(self):
+        self._slot[ACTIVE] = 0
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    sample_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+
+    backend = make_backend(sample_rate, channels)
+    bus = AudioBus(sample_rate=sample_rate, channels=channels, create=True)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    bus.start()
+    backend.start(bus.write)
+    logger.info(f"Audio bus {BUS_NAME} up: {sample_rate} Hz, {channels} channel(s)")
+    try:
+        while not stopping and bus.running:
+            time.sleep(STATS_INTERVAL)
+            for consumer, (lag, overruns) in bus.stats().items():
+                logger.info(f"Consumer {consumer}: lag {lag / sample_rate * 1000:.0f} ms, "
+                            f"{overruns} overrun(s)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.stop()
+        bus.write(None)
+        bus.close()
+        bus.unlink()
+
+
+if __name__ == "__main__":
+    main()
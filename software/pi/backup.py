@@ -4,8 +4,8 @@ import signal
 import subprocess
 import sys
 from audio import get_doa_angle
-from play_wav import play_wav
-from basic_movement import forward, turn
+from play_wav import play_wav, get_player, close_player
+from basic_movement import forward, turn, halt, close_executor
 from read_from_serial import SerialReader
 
 # Global flag for graceful shutdown
@@ -47,6 +47,7 @@ def handle_command(command):
             direction = cmd[0].lower()
             if direction == "stop":
                 logger.info("Received STOP command, stopping follow mode")
+                halt()
                 play_wav(path="/home/hexapolo/project/found.wav")
                 continue_follow = False 
             else:
@@ -54,8 +55,10 @@ def handle_command(command):
                 if direction == 'left':
                     angle *= -1
                 logger.info(f"Executing turn command: {direction} {angle}°")
-                turn(angle)
-                forward(5)
+                # Both return at once: the robot walks while turning, and the next
+                # correction preempts them instead of waiting for the 5 s walk
+                turn(angle, wait=False)
+                forward(5, wait=False)
         else:
             logger.warning(f"Invalid command format: {command}")
     except Exception as e:
@@ -81,6 +84,7 @@ def follow():
         logger.error(f"Error in follow mode: {e}")
     finally:
         logger.info("Stopping follow mode and closing serial connection")
+        halt()
         serial_reader.send_message("stop")
         serial_reader.stop()
 
@@ -118,9 +122,12 @@ if __name__ == "__main__":
     logger.info("System: ESP32 Camera -> Laptop CV -> ESP32 -> Pi Robot Control")
 
     try:
+        get_player()
         main_control_loop()
     except Exception as e:
         logger.error(f"Fatal error in robot control service: {e}")
         sys.exit(1)
     finally:
+        close_player()
+        close_executor()
         logger.info("Robot Control Service Stopped")
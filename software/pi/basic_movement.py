@@ -1,5 +1,7 @@
 from gpiozero import Motor
-from time import sleep
+from collections import deque
+import threading
+import time
 import logging
 
 # Setup logger
@@ -8,44 +10,201 @@ logger = logging.getLogger(__name__)
 walk_motor = Motor(forward=4, backward=11)
 turn_motor = Motor(forward=23, backward=24)
 
-def forward(duration=1, speed=1):
-    """Move forward for specified duration in seconds"""
+LATENCY_HISTORY = 200  # Commands kept for the command-to-actuation latency stats
+
+_executor = None
+
+class MotionCommand:
+    """Handle of a submitted motion, completed when it ends, is preempted or fails"""
+
+    def __init__(self, motor, action, duration, speed):
+        self.motor = motor
+        self.action = action
+        self.duration = duration
+        self.speed = speed
+        self.submitted = time.monotonic()
+        self.actuated = None   # time.monotonic() the motor was driven
+        self.deadline = None
+        self.status = "pending"
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def latency(self):
+        """Seconds from submission to the motor being driven, or None"""
+        return None if self.actuated is None else self.actuated - self.submitted
+
+    @property
+    def remaining(self):
+        """Seconds before the motion ends (0 once it has)"""
+        if self.done():
+            return 0.0
+        if self.deadline is None:
+            return self.duration
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """Wait for the motion; returns "done" or "preempted", raises if the motor failed"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.motor} {self.action} still running")
+        if self.error is not None:
+            raise self.error
+        return self.status
+
+    def _finish(self, status, error=None):
+        self.status = status
+        self.error = error
+        self._done.set()
+
+class MotionExecutor:
+    """Drives the motors from one thread; a new command preempts the running one on the same motor.
+
+    Callers submit a motion and get a MotionCommand back right away, so a fresh
+    turn correction replaces the current turn within one wake-up of this thread
+    instead of waiting for the previous sleep() to end. The walk and turn
+    motors are independent: walking goes on while a turn is replaced.
+    """
+
+    def __init__(self, motors=None):
+        self.motors = motors or {"walk": walk_motor, "turn": turn_motor}
+        self.latencies = deque(maxlen=LATENCY_HISTORY)
+        self._pending = {}   # Newest command per motor, not yet actuated
+        self._active = {}    # Running command per motor
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, motor, action, duration, speed=1):
+        """Queue `action` ("forward" or "backward") on `motor` for `duration` seconds"""
+        command = MotionCommand(motor, action, duration, speed)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Motion executor is closed")
+            replaced = self._pending.get(motor)
+            if replaced is not None:
+                replaced._finish("preempted")
+            self._pending[motor] = command
+            self._cond.notify()
+        return command
+
+    def halt(self):
+        """Stop every motor and drop the pending and running commands"""
+        with self._cond:
+            for commands in (self._pending, self._active):
+                for command in commands.values():
+                    command._finish("preempted")
+                commands.clear()
+            for motor in self.motors.values():
+                motor.stop()
+
+    def _next_wakeup(self):
+        if self._pending:
+            return 0.0
+        if not self._active:
+            return None
+        return max(min(c.deadline for c in self._active.values()) - time.monotonic(), 0.0)
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                self._cond.wait_for(lambda: not self._running or self._pending, self._next_wakeup())
+
+                for name, command in list(self._pending.items()):
+                    del self._pending[name]
+                    motor = self.motors[name]
+                    previous = self._active.pop(name, None)
+                    if previous is not None:
+                        logger.debug(f"{name} {previous.action} preempted by {command.action}")
+                        previous._finish("preempted")
+                    try:
+                        # No stop in between, so a refreshed walk keeps the motor running
+                        getattr(motor, command.action)(command.speed)
+                    except Exception as e:
+                        logger.error(f"Error during {name} movement: {e}")
+                        motor.stop()  # Ensure motor stops on error
+                        command._finish("failed", e)
+                        continue
+                    command.actuated = time.monotonic()
+                    command.deadline = command.actuated + command.duration
+                    command.status = "running"
+                    self.latencies.append(command.latency)
+                    self._active[name] = command
+
+                now = time.monotonic()
+                for name, command in list(self._active.items()):
+                    if command.deadline <= now:
+                        del self._active[name]
+                        self.motors[name].stop()
+                        command._finish("done")
+                        logger.debug(f"{name} {command.action} completed successfully")
+
+    def stats(self):
+        """Mean and max command-to-actuation latency in seconds"""
+        latencies = list(self.latencies)
+        if not latencies:
+            return float('nan'), float('nan')
+        return sum(latencies) / len(latencies), max(latencies)
+
+    def close(self):
+        self.halt()
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        if self.latencies:
+            mean, worst = self.stats()
+            logger.info(f"Motion executor: command-to-actuation latency {mean * 1000:.1f} ms mean / "
+                        f"{worst * 1000:.1f} ms max over {len(self.latencies)} commands")
+
+def get_executor():
+    """Shared motion executor, started on first use"""
+    global _executor
+    if _executor is None:
+        _executor = MotionExecutor()
+    return _executor
+
+def close_executor():
+    global _executor
+    if _executor is not None:
+        _executor.close()
+        _executor = None
+
+def halt():
+    """Stop all motion right away"""
+    if _executor is not None:
+        _executor.halt()
+
+def forward(duration=1, speed=1, wait=True):
+    """Move forward for specified duration in seconds; returns the MotionCommand"""
     logger.info(f"Walking forward for {duration} second(s) at speed {speed}")
-    try:
-        walk_motor.forward(speed)
-        sleep(duration)
-        walk_motor.stop()
-        logger.debug(f"Forward movement completed successfully")
-    except Exception as e:
-        logger.error(f"Error during forward movement: {e}")
-        walk_motor.stop()  # Ensure motor stops on error
-        raise
-
-def turn(angle, speed=1):
-    """Turn by specified angle in degrees (positive=right, negative=left)"""
+    command = get_executor().submit("walk", "forward", duration, speed)
+    if wait:
+        command.result()
+    return command
+
+def turn(angle, speed=1, wait=True):
+    """Turn by specified angle in degrees (positive=right, negative=left); returns the MotionCommand"""
     # Convert angle to time-based turn (simplified approach)
     # Shortest turn
     if angle > 180:
         angle -= 360
     elif angle < -180:
         angle += 360
-    
+
     direction = 'CCW' if angle > 0 else 'CW'
     logger.info(f"Turning {direction} by {abs(angle)}° at speed {speed}")
 
     turn_time = abs(angle) / 50 * 0.5  # 0.5s per 90 degrees
     logger.debug(f"Calculated turn time: {turn_time:.2f} seconds")
 
-    try:
-        if angle > 0:
-            turn_motor.backward(speed)
-        else:
-            turn_motor.forward(speed)
-
-        sleep(turn_time)
-        turn_motor.stop()
-        logger.debug(f"Turn movement completed successfully")
-    except Exception as e:
-        logger.error(f"Error during turn movement: {e}")
-        turn_motor.stop()  # Ensure motor stops on error
-        raise
+    command = get_executor().submit("turn", "backward" if angle > 0 else "forward", turn_time, speed)
+    if wait:
+        command.result()
+    return command
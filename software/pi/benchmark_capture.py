@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Compare the raw and XMOS-processed detection paths on the robot.
+
+Needs the 6-channel firmware. Each path opens its own capture session with
+the channels and rate the service uses for it and applies its Tuning profile;
+the script reports the tone SNR at the target bin, the Pi CPU time the
+detector spends per second of audio and the CPU the capture itself takes
+(measured while the profile settles, with nothing reading).
+
+    python benchmark_capture.py [seconds per phase]
+"""
+import sys
+import time
+import logging
+import numpy as np
+import usb.core
+from usb_4_mic_array.tuning import Tuning
+from capture import CaptureSession, make_backend
+from detectors import FilterBankDetector
+from play_wav import play_wav
+from calibrate_and_detect import AUDIO_DEVICE, TARGET_FREQS, MIN_TONE_DURATION, countdown_files
+
+SETTLE_TIME = 2.0      # Seconds for the XMOS noise suppression to adapt after a profile change
+
+# name: (sample rate, captured channels, detection channel, Tuning profile, harmonics checked on the Pi)
+PATHS = {
+    "default": (8000, 1, 0, "service", (2, 3)),      # PROCESSED_AUDIO = False, SOFTWARE_DOA = False
+    "processed": (16000, 6, 0, "processed", ()),   # PROCESSED_AUDIO = True
+}
+
+logger = logging.getLogger(__name__)
+
+
+def record(session, channel, seconds):
+    reader = session.reader(channel=channel)
+    hop = session.sample_rate // 200
+    chunks = []
+    for _ in range(int(seconds * session.sample_rate) // hop):
+        samples = reader.read(hop, timeout=1)
+        if samples is None:
+            break
+        chunks.append(samples.copy())
+    return np.concatenate(chunks)
+
+
+def run_detector(samples, sample_rate, harmonics):
+    """(target powers per hop, CPU seconds) of the detection pipeline over samples"""
+    chunk_size, hop = sample_rate * 205 // 8000, sample_rate // 200  # As in calibrate_and_detect
+    detector = FilterBankDetector(TARGET_FREQS, np.inf, sample_rate, chunk_size, hop=hop,
+                                  min_duration=MIN_TONE_DURATION, harmonics=harmonics)
+    powers = []
+    start = time.process_time()
+    for i in range(0, len(samples), hop):
+        detector.feed(samples[i:i + hop])
+        powers.append(detector.powers)
+    return np.concatenate(powers), time.process_time() - start
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+
+    dev = usb.core.find(idVendor=0x2886, idProduct=0x0018)
+    if not dev:
+        logger.error("Mic array not found")
+        sys.exit(1)
+    tuning = Tuning(dev)
+
+    results = {}
+    try:
+        for name, (rate, channels, channel, profile, harmonics) in PATHS.items():
+            logger.info(f"\n🎛️  {name} path: {channels} channel(s) at {rate} Hz, "
+                        f"channel {channel}, profile {profile}")
+            session = CaptureSession(make_backend(rate, channels, device=AUDIO_DEVICE))
+            session.start()
+            try:
+                tuning.apply_profile(profile)
+                # Whole-process CPU while only the capture runs
+                cpu_start, wall_start = time.process_time(), time.monotonic()
+                time.sleep(SETTLE_TIME)
+                capture_load = (time.process_time() - cpu_start) / (time.monotonic() - wall_start)
+
+                logger.info("🔇 Recording background noise...")
+                noise = record(session, channel, seconds)
+
+                logger.info("🔊 Play the tone now")
+                for file in countdown_files:
+                    play_wav(file)
+                    time.sleep(0.5)
+                tone = record(session, channel, seconds)
+            finally:
+                session.stop()
+
+            noise_powers, noise_cpu = run_detector(noise, rate, harmonics)
+            tone_powers, tone_cpu = run_detector(tone, rate, harmonics)
+            snr = 10 * np.log10(tone_powers.mean(axis=0) / np.maximum(noise_powers.mean(axis=0), 1e-12))
+            detect_load = (noise_cpu + tone_cpu) / (len(noise) + len(tone)) * rate
+            results[f"{name} ({channels}ch {rate // 1000}k)"] = (snr, detect_load, capture_load)
+    finally:
+        tuning.close()
+
+    logger.info(f"\n{'path':>20} {'SNR (dB)':>16} {'detector CPU %':>15} {'capture CPU %':>14}")
+    for name, (snr, detect_load, capture_load) in results.items():
+        logger.info(f"{name:>20} {str(np.round(snr, 1).tolist()):>16} "
+                    f"{100 * detect_load:>15.2f} {100 * capture_load:>14.2f}")
+
+if __name__ == "__main__":
+    main()
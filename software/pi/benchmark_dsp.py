@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the Goertzel implementations across chunk sizes, batches and dtypes.
+
+    python benchmark_dsp.py [OUT.json] [--compare BASELINE.json]
+
+Every implementation computes the power of the target bin for a batch of
+chunks; the suite reports ns per input sample (the best of REPEATS timings
+spread over the run, so a busy moment does not count as a regression) and
+the memory allocated per call (tracemalloc peak and block count).
+dsp.goertzel_bank_powers works in float64, so "numpy" on int16 and float64
+input times the service path, while on float32 input it times a float32
+projection the service does not use. Results go to OUT.json so runs on the
+Pi can be compared; with --compare, cases more than REGRESSION times slower
+than the baseline are flagged.
+"""
+import sys
+import json
+import time
+import timeit
+import platform
+import tracemalloc
+import numpy as np
+from dsp import goertzel_bank_powers, goertzel_bank_table, goertzel_coeff, goertzel_scalar
+
+try:
+    from scipy.signal import lfilter
+except ImportError:
+    lfilter = None
+
+SAMPLE_RATE = 8000
+TARGET_FREQ = 1000
+CHUNK_SIZES = (105, 205, 410, 820)
+BATCH_SIZES = (1, 16, 256)
+DTYPES = ("int16", "float32", "float64")
+MIN_TIME = 0.05        # Seconds of each timing repeat
+REPEATS = 7            # Timings per case, the fastest is kept
+REGRESSION = 1.2       # Slowdown over the baseline that counts as a regression
+
+
+def scalar_impl(chunks, chunk_size):
+    coeff = goertzel_coeff(TARGET_FREQ, chunk_size, SAMPLE_RATE)
+    return lambda: [goertzel_scalar(chunk, coeff) for chunk in chunks]
+
+
+def numpy_impl(chunks, chunk_size):
+    table = goertzel_bank_table([TARGET_FREQ], chunk_size, SAMPLE_RATE)
+    if chunks.dtype == np.float32:
+        # goertzel_bank_powers would cast back to float64; project in float32 instead
+        table = table.astype(np.float32)
+
+        def run():
+            proj = chunks @ table
+            return proj[:, 0] ** 2 + proj[:, 1] ** 2
+        return run
+    return lambda: goertzel_bank_powers(chunks, table)
+
+
+def lfilter_impl(chunks, chunk_size):
+    coeff = goertzel_coeff(TARGET_FREQ, chunk_size, SAMPLE_RATE)
+    a = [1.0, -coeff, 1.0]
+
+    def run():
+        # The recurrence s[n] = x[n] + coeff s[n-1] - s[n-2] as an IIR filter
+        s = lfilter([1.0], a, chunks, axis=1)
+        return s[:, -1] ** 2 + s[:, -2] ** 2 - coeff * s[:, -1] * s[:, -2]
+    return run
+
+
+def fft_impl(chunks, chunk_size):
+    k = int(0.5 + chunk_size * TARGET_FREQ / SAMPLE_RATE)
+    return lambda: np.abs(np.fft.rfft(chunks, axis=1)[:, k]) ** 2
+
+
+IMPLEMENTATIONS = {
+    "scalar": scalar_impl,
+    "numpy": numpy_impl,
+    "lfilter": lfilter_impl,
+    "fft": fft_impl,
+}
+
+
+def prepare(run):
+    """Warm up caches and FFT plans; return how many calls make one timing of MIN_TIME"""
+    run()
+    start = time.perf_counter()
+    run()
+    return max(1, int(MIN_TIME / max(time.perf_counter() - start, 1e-9)))
+
+
+def allocations(run):
+    """(bytes allocated at peak, allocated blocks) of one call"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename")
+                 if stat.count_diff > 0)
+    tracemalloc.stop()
+    return peak, blocks
+
+
+def make_cases():
+    """[(key, run, samples per call, calls per timing)] of every benchmarked case"""
+    rng = np.random.default_rng(0)
+    cases = []
+    for chunk_size in CHUNK_SIZES:
+        for batch in BATCH_SIZES:
+            for dtype in DTYPES:
+                chunks = (rng.standard_normal((batch, chunk_size)) * 3000).astype(dtype)
+                for name, make in IMPLEMENTATIONS.items():
+                    if name == "lfilter" and lfilter is None:
+                        continue
+                    if name == "scalar" and batch > 16:
+                        continue  # Pure Python, would dominate the run time
+                    run = make(chunks, chunk_size)
+                    cases.append(((name, chunk_size, batch, dtype), run, chunks.size, prepare(run)))
+    return cases
+
+
+def time_cases(cases, best, repeats=REPEATS):
+    """Lower best[key] (ns per sample) to the fastest of `repeats` more timings of each case.
+
+    Repeats go round all the cases rather than back to back, so a busy stretch
+    of the machine spoils one timing of many cases, not every timing of one.
+    """
+    for _ in range(repeats):
+        for key, run, n_samples, calls in cases:
+            ns = timeit.timeit(run, number=calls) / calls / n_samples * 1e9
+            best[key] = min(best.get(key, np.inf), ns)
+    return best
+
+
+def report(cases, best):
+    results = []
+    for (name, chunk_size, batch, dtype), run, _, _ in cases:
+        ns = best[name, chunk_size, batch, dtype]
+        peak, blocks = allocations(run)
+        results.append({"impl": name, "chunk_size": chunk_size, "batch": batch,
+                        "dtype": dtype, "ns_per_sample": round(ns, 2),
+                        "peak_bytes": peak, "alloc_blocks": blocks})
+        print(f"{name:>8} {chunk_size:>5} x {batch:<4} {dtype:>8} "
+              f"{ns:>10.1f} ns/sample {peak:>10} B {blocks:>5} blocks")
+    return results
+
+
+def compare(cases, best, baseline):
+    """Count the cases still slower than the baseline after timing the suspects again"""
+    old = {(r["impl"], r["chunk_size"], r["batch"], r["dtype"]): r["ns_per_sample"]
+           for r in baseline["results"]}
+    slow = lambda key: key in old and best[key] > REGRESSION * old[key]
+    suspects = [case for case in cases if slow(case[0])]
+    if suspects:
+        print(f"Timing {len(suspects)} suspected regression(s) again...")
+        time_cases(suspects, best)
+
+    regressions = 0
+    for key, _, _, _ in suspects:
+        if slow(key):
+            regressions += 1
+            print(f"⚠️  {key}: {old[key]} -> {best[key]:.2f} ns/sample")
+    print(f"{regressions} regression(s) against the baseline")
+    return regressions
+
+
+def main():
+    args = sys.argv[1:]
+    baseline = None
+    if "--compare" in args:
+        i = args.index("--compare")
+        with open(args[i + 1]) as f:
+            baseline = json.load(f)
+        del args[i:i + 2]
+    out = args[0] if args else "benchmark_dsp.json"
+
+    cases = make_cases()
+    best = time_cases(cases, {})
+    regressions = compare(cases, best, baseline) if baseline is not None else 0
+
+    results = report(cases, best)
+    with open(out, "w") as f:
+        json.dump({"machine": platform.machine(), "python": platform.python_version(),
+                   "numpy": np.__version__, "timestamp": time.time(), "results": results}, f, indent=2)
+    print(f"Results saved to {out}")
+
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,43 @@
 import sys
-import struct
+import asyncio
 import logging
-import math
+import threading
 import time
-import subprocess
-from play_wav import play_wav
+import numpy as np
+from play_wav import play_wav, sounding
+from capture import CaptureSession, make_backend
+from calibration_cache import load_calibration, save_calibration
+from dsp import goertzel_bank_powers, goertzel_bank_table
+from detectors import Cfar, FilterBankDetector, NoiseFloor
+from stats import RunningStats
 
 # Constants
-SAMPLE_RATE = 8000     # 8 kHz
-CHUNK_SIZE = 205       # ~25ms at 8kHz (tweakable)
+SOFTWARE_DOA = False   # GCC-PHAT on the raw mics instead of the XMOS DOA (needs 6_channels_firmware.bin)
+PROCESSED_AUDIO = False  # Detect on the XMOS-processed channel 0 (HPF and noise suppression on chip)
+SAMPLE_RATE = 16000 if SOFTWARE_DOA or PROCESSED_AUDIO else 8000  # Native rate of the 6-channel stream
+CAPTURE_CHANNELS = 6 if SOFTWARE_DOA or PROCESSED_AUDIO else 1
+DETECT_CHANNEL = 0 if PROCESSED_AUDIO else 1 if SOFTWARE_DOA else 0  # Processed channel 0 or raw mic 1
+MIC_PROFILE = "processed" if PROCESSED_AUDIO else "service"  # usb_4_mic_array/profiles.json entry applied at startup
+CHUNK_SIZE = SAMPLE_RATE * 205 // 8000         # ~25ms (tweakable)
 TARGET_FREQ = 1000     # Frequency to detect (Hz)
 MEASURE_DURATION = 3   # Seconds to measure each phase
-EPS = 1e-6             # prevent divide by 0
+FALSE_ALARM_RATE = 0.01  # Share of noise chunks allowed above the threshold (before the N-of-M vote)
+MIN_DETECTION_RATE = 0.9 # Share of tone chunks that must stay above it
+TONE_QUANTILE = 0.1    # Tone level the threshold falls back towards when the two overlap
+HOP_SIZE = SAMPLE_RATE // 200  # Detector re-evaluates the last chunk every 5ms
+MIN_TONE_DURATION = 0.3  # Seconds the tone must last (~12 chunks of 25ms)
+DETECT_PREROLL = 0.5   # Seconds of already captured audio detect() looks back at
+ECHO_GATE = not PROCESSED_AUDIO  # Blank the detector while our prompts play (on-chip AEC removes them when processed)
+DETECT_TIMEOUT = 15    # Seconds detect() listens before giving up
+READ_TIMEOUT = 0.1     # Longest wait for audio, bounds how fast cancellation is noticed
 TARGET_FREQ = 1000     # Frequency to detect (Hz)
+TARGET_FREQS = [TARGET_FREQ]  # Tones this robot answers to (one per robot in a shared room)
+GUARD_FREQS = []       # Other robots' tones, only used to reject their calls
+HARMONICS = () if PROCESSED_AUDIO else (2, 3)  # Harmonics checked to reject broadband noise (done on chip when processed)
+MIN_SNR_DB = 15.0      # CFAR trigger level; None falls back to the calibrated threshold
+CFAR_REFERENCE = 1.0   # Seconds of noise history in the CFAR reference window
+CFAR_GUARD = 0.05      # Seconds a hop waits before entering the reference window
+DOA_BAND = 100         # Hz around the target tone used by the software DOA
 AUDIO_DEVICE = "default:CARD=ArrayUAC10"  # Find with: arecord -L
 DIR = "/home/hexapolo/project"
 
@@ -20,39 +45,40 @@ countdown_files = [f"{DIR}/3.wav", f"{DIR}/2.wav", f"{DIR}/1.wav"]
 
 logger = logging.getLogger(__name__)
 
-# Pre-compute Goertzel constants
-k = int(0.5 + ((CHUNK_SIZE * TARGET_FREQ) / SAMPLE_RATE))
-omega = (2.0 * math.pi * k) / CHUNK_SIZE
-cosine = math.cos(omega)
-coeff = 2.0 * cosine
-
-# Goertzel algorithm
-def goertzel(samples):
-    s_prev = 0.0
-    s_prev2 = 0.0
-    for sample in samples:
-        s = sample + coeff * s_prev - s_prev2
-        s_prev2 = s_prev
-        s_prev = s
-    power = s_prev2**2 + s_prev**2 - coeff * s_prev * s_prev2
-    return power
-
-# Start audio recording process
-def start_recording():
-    return subprocess.Popen(
-        ["arecord", "-D", AUDIO_DEVICE, "-f", "S16_LE", "-r", str(SAMPLE_RATE)],
-        stdout=subprocess.PIPE
-    )
-
-# Function to read a chunk of audio data
-def read_chunk(process):
-    data = process.stdout.read(CHUNK_SIZE * 2)  # Read directly from subprocess pipe
-    if len(data) < CHUNK_SIZE * 2:
-        return None
-    return struct.unpack('<' + 'h' * CHUNK_SIZE, data)
+# Pre-compute Goertzel table for every target tone
+GOERTZEL_TABLE = goertzel_bank_table(TARGET_FREQS, CHUNK_SIZE, SAMPLE_RATE)
+
+_session = None
+_noise_floor = None    # Room noise tracked online since the last calibration
+_calibrated_at = None
+_cfar = None           # Kept across detect() calls so the noise estimate stays warm
+last_detection = None  # (onset, decision) time.monotonic() stamps of the last tone heard
+_last_window = None    # (start, stop) capture sample indices of the last tone heard
+
+def get_session():
+    """Shared capture session, opened once and kept for the life of the service"""
+    global _session
+    if _session is None or not _session.running:
+        if _session is not None:
+            logger.warning("Capture session died, reopening the audio device")
+        _session = CaptureSession(make_backend(SAMPLE_RATE, CAPTURE_CHANNELS, device=AUDIO_DEVICE))
+        _session.start()
+    return _session
+
+def close_session():
+    """Release the audio device held by the shared capture session"""
+    global _session
+    if _session is not None:
+        _session.stop()
+        _session = None
 
 # Function to measure energy in a phase
-def measure_phase(prompt, process, tone=False):
+def measure_phase(prompt, session, tone=False, quantiles=(), on_tone=None):
+    """Return (per-chunk powers, RunningStats) of the target bins over one phase.
+
+    For the tone phase, `on_tone` is called with True when measuring starts and
+    with False once it ends (simulate.py switches its synthetic tone with it).
+    """
     logger.info(f"\n🔊 {prompt}")
 
     if tone:
@@ -64,97 +90,250 @@ def measure_phase(prompt, process, tone=False):
 
     logger.info("Measuring...")
 
-    energies = []
-    start_time = time.time()
-    raw_chunks = []
+    n_chunks = int(MEASURE_DURATION * SAMPLE_RATE) // CHUNK_SIZE
+    energies = np.empty((n_chunks, len(TARGET_FREQS)))
+    stats = RunningStats(len(TARGET_FREQS), quantiles)
+    reader = session.reader(channel=DETECT_CHANNEL)
 
-    # Only read data during measurement period
-    while (time.time() - start_time) < MEASURE_DURATION:
-        samples = read_chunk(process)
-        if samples is None:
-            break
-        raw_chunks.append(samples)  # Store without processing
-    
-    # Process data AFTER acquisition
-    energies = [goertzel(chunk) for chunk in raw_chunks]
+    # Only read data captured during the measurement period, processing each chunk as it arrives
+    if tone and on_tone:
+        on_tone(True)
+    count = 0
+    try:
+        while count < n_chunks:
+            samples = reader.read(CHUNK_SIZE)
+            if samples is None:
+                break
+            energies[count] = goertzel_bank_powers(samples[None, :], GOERTZEL_TABLE)[0]
+            stats.update(energies[count])
+            count += 1
+    finally:
+        if tone and on_tone:
+            on_tone(False)
 
     logger.info(" done.")
-    return energies
+    return energies[:count], stats
 
 
-def calibrate():
-    process = start_recording()
+def calibrate(session=None, on_tone=None):
+    session = session or get_session()
 
     # -------- Calibration flow --------
-    try:
-        logger.info("🎛️  Goertzel Frequency Detector with Calibration and Detection")
-        logger.info(f"Target frequency: {TARGET_FREQ} Hz")
-        logger.info(f"Sample rate: {SAMPLE_RATE} Hz, Chunk size: {CHUNK_SIZE} samples\n")
+    logger.info("🎛️  Goertzel Frequency Detector with Calibration and Detection")
+    logger.info(f"Target frequencies: {TARGET_FREQS} Hz")
+    logger.info(f"Sample rate: {SAMPLE_RATE} Hz, Chunk size: {CHUNK_SIZE} samples\n")
+
+    # Phase 1: background noise
+    noise_energies, noise = measure_phase("Ensure no tone is playing (just background noise).", session,
+                                          quantiles=(1 - FALSE_ALARM_RATE,))
+
+    # Phase 2: tone signal
+    tone_energies, tone = measure_phase("Now play the tone at target frequency.", session, True,
+                                        quantiles=(TONE_QUANTILE,), on_tone=on_tone)
+
+    # One threshold per target bin from the noise distribution, for the target false-alarm rate
+    threshold = noise.quantile(1 - FALSE_ALARM_RATE)
+    detection_rate = (tone_energies >= threshold).mean(axis=0)
+    weak = detection_rate < MIN_DETECTION_RATE
+    if weak.any():
+        # Tone too close to the noise: trade false alarms for detections
+        threshold[weak] = (threshold[weak] + tone.quantile(TONE_QUANTILE)[weak]) / 2
+        detection_rate = (tone_energies >= threshold).mean(axis=0)
+    false_alarm_rate = (noise_energies >= threshold).mean(axis=0)
+
+    global _noise_floor, _calibrated_at, _cfar
+    _noise_floor = NoiseFloor(noise.mean)
+    _calibrated_at = time.time()
+    _cfar = None  # Re-seed CFAR from the new noise floor
+    save_calibration(_cache_data(threshold), timestamp=_calibrated_at)
+
+    logger.info("\n📈 Calibration Results:")
+    for i, freq in enumerate(TARGET_FREQS):
+        logger.info(f"  [{freq} Hz] Avg noise energy: {int(noise.mean[i])} ± {int(noise.std[i])}")
+        logger.info(f"  [{freq} Hz] Max noise energy: {int(noise.max[i])}")
+        logger.info(f"  [{freq} Hz] Min tone energy:  {int(tone.min[i])}")
+        logger.info(f"  [{freq} Hz] Avg tone energy:  {int(tone.mean[i])} ± {int(tone.std[i])}")
+        logger.info(f"  [{freq} Hz] Chunks above threshold: {100 * false_alarm_rate[i]:.1f}% of noise, "
+                    f"{100 * detection_rate[i]:.1f}% of tone")
+        if weak[i]:
+            logger.warning(f"  [{freq} Hz] Tone barely above the noise, threshold lowered")
+        logger.info(f"\n✅ Suggested THRESHOLD for {freq} Hz: {int(threshold[i])}")
 
-        # Phase 1: background noise
-        noise_energies = measure_phase("Ensure no tone is playing (just background noise).", process)
-
-        # Phase 2: tone signal
-        tone_energies = measure_phase("Now play the tone at target frequency.", process, True)
-
-        # Analyze and suggest threshold
-        avg_noise = sum(noise_energies) / (len(noise_energies) + EPS)
-        max_noise = max(noise_energies)
-
-        avg_tone = sum(tone_energies) / (len(tone_energies) + EPS)
-        min_tone = min(tone_energies)
-
-        threshold = (max_noise + min_tone) / 2
-
-
-        logger.info("\n📈 Calibration Results:")
-        logger.info(f"  Avg noise energy: {int(avg_noise)}")
-        logger.info(f"  Max noise energy: {int(max_noise)}")
-        logger.info(f"  Min tone energy:  {int(min_tone)}")
-        logger.info(f"  Avg tone energy:  {int(avg_tone)}")
-        logger.info(f"\n✅ Suggested THRESHOLD: {int(threshold)}")
-
-        logger.info("\nℹ️ Use this value in your detection script like:")
-        logger.info(f"   THRESHOLD = {int(threshold)}")
-    finally:
-        process.terminate()
+    return threshold
 
+def _cache_data(threshold):
+    return {
+        "sample_rate": SAMPLE_RATE,
+        "chunk_size": CHUNK_SIZE,
+        "targets": TARGET_FREQS,
+        "false_alarm_rate": FALSE_ALARM_RATE,
+        "channel": DETECT_CHANNEL,
+        "mic_profile": MIC_PROFILE,
+        "thresholds": np.asarray(threshold).tolist(),
+        "noise_reference": _noise_floor.reference.tolist(),
+        "noise_mean": _noise_floor.mean.tolist(),
+    }
+
+def load_or_calibrate(session=None):
+    """Reuse a still valid cached calibration, or run a full calibrate()"""
+    global _noise_floor, _calibrated_at, _cfar
+    data = load_calibration(sample_rate=SAMPLE_RATE, chunk_size=CHUNK_SIZE, targets=TARGET_FREQS,
+                            false_alarm_rate=FALSE_ALARM_RATE, channel=DETECT_CHANNEL, mic_profile=MIC_PROFILE)
+    if data is None:
+        return calibrate(session)
+
+    _noise_floor = NoiseFloor(data["noise_reference"], data["noise_mean"])
+    _calibrated_at = data["timestamp"]
+    _cfar = None
+    threshold = np.array(data["thresholds"])
+    logger.info(f"✅ Cached THRESHOLD: {threshold.astype(int).tolist()}")
     return threshold
 
-def detect(threshold):
-    process = start_recording()
+def save_noise_floor(threshold):
+    """Persist the online noise statistics next to the calibration they refine"""
+    if _noise_floor is not None:
+        save_calibration(_cache_data(threshold), timestamp=_calibrated_at)
+
+def make_cfar(seed=None):
+    """CFAR stage with the service settings"""
+    return Cfar(len(TARGET_FREQS),
+                reference_size=int(CFAR_REFERENCE * SAMPLE_RATE / HOP_SIZE),
+                guard_size=int(CFAR_GUARD * SAMPLE_RATE / HOP_SIZE),
+                min_snr_db=MIN_SNR_DB,
+                seed=seed)
+
+def get_cfar():
+    """Shared CFAR stage, seeded with the calibrated noise floor when there is one"""
+    global _cfar
+    if _cfar is None and MIN_SNR_DB is not None:
+        _cfar = make_cfar(None if _noise_floor is None else _noise_floor.mean)
+    return _cfar
+
+def make_detector(threshold, noise_floor=None, cfar=None, rearm=False):
+    """The detector detect() runs, also used to replay recordings offline"""
+    return FilterBankDetector(TARGET_FREQS, threshold, SAMPLE_RATE, CHUNK_SIZE,
+                              hop=HOP_SIZE, min_duration=MIN_TONE_DURATION,
+                              harmonics=HARMONICS, guards=GUARD_FREQS,
+                              noise_floor=noise_floor, cfar=cfar, rearm=rearm)
+
+class DetectionEvent:
+    """One detected tone, with time.monotonic() stamps of its onset and of the decision"""
+
+    def __init__(self, freq, onset, decision, peak_energy, snr_db, channel, window):
+        self.freq = freq
+        self.onset = onset
+        self.decision = decision
+        self.duration = decision - onset  # Seconds of tone heard before deciding
+        self.peak_energy = peak_energy
+        self.snr_db = snr_db
+        self.channel = channel
+        self.window = window              # (start, stop) capture sample indices
+
+    def __repr__(self):
+        return (f"DetectionEvent({self.freq} Hz, onset={self.onset:.3f}, duration={self.duration:.3f}, "
+                f"energy={int(self.peak_energy)}, snr={self.snr_db:.1f} dB, channel={self.channel})")
+
+def detection_events(threshold, session=None, cancel=None, timeout=None):
+    """Yield a DetectionEvent for every tone heard in the continuous capture stream.
+
+    Stops once `cancel` (a threading.Event) is set, within READ_TIMEOUT, after
+    `timeout` seconds if given, or when the stream ends. A target is detected
+    again once it has been silent for a whole vote window. Hops heard while
+    one of our own prompts is sounding are blanked (see ECHO_GATE), so the
+    caller can start listening while a prompt is still playing.
+    """
+    global last_detection, _last_window
+    session = session or get_session()
+    # Start slightly in the past so a tone starting between two calls is not lost
+    reader = session.reader(preroll=DETECT_PREROLL, channel=DETECT_CHANNEL)
+    first_sample = reader.position
+    detector = make_detector(threshold, _noise_floor, get_cfar(), rearm=True)
 
     # -------- Detection flow --------
-    try:
-        logger.info("\n🔍 Starting frequency detection...")
-        start_time = time.time()
-        counter = 0
-        time_diff = 0
-        detected = False
-
-        while time_diff < 15:
-            samples = read_chunk(process)
-            time_diff = time.time() - start_time
-
-            if time_diff % 1 == 0:
-                counter = 0
-
-            if samples is None:
+    logger.info("\n🔍 Starting frequency detection...")
+    start_time = time.monotonic()
+    chunk_snr = np.full(len(TARGET_FREQS), -np.inf)
+    hops_per_chunk = max(CHUNK_SIZE // HOP_SIZE, 1)
+    hops = 0
+    blanked = False
+
+    while not (cancel is not None and cancel.is_set()):
+        if timeout is not None and time.monotonic() - start_time >= timeout:
+            break
+        # Read one hop at a time so the decision is not delayed by a full chunk
+        samples = reader.read(HOP_SIZE, timeout=READ_TIMEOUT)
+        if samples is None:
+            if not session.running:
                 break
+            continue
+
+        # Blank the hop if its Goertzel window overlaps one of our prompts
+        blank = ECHO_GATE and sounding(session.sample_time(reader.position - CHUNK_SIZE),
+                                       session.sample_time(reader.position))
+        if blank != blanked:
+            logger.debug("Own prompt playing, detector blanked" if blank else "Detector unblanked")
+            blanked = blank
+        found = detector.feed(samples, blank=blank)
+
+        # Per-chunk SNR, to tune MIN_SNR_DB from the logs
+        if len(detector.snr_db):
+            chunk_snr = np.maximum(chunk_snr, detector.snr_db.max(axis=0))
+            hops += len(detector.snr_db)
+        if hops >= hops_per_chunk:
+            logger.debug(f"SNR: {np.round(chunk_snr, 1).tolist()} dB")
+            chunk_snr[:] = -np.inf
+            hops = 0
+
+        for freq in found:
+            i = detector.targets.index(freq)
+            _last_window = (first_sample + int(detector.onset_samples[i]),
+                            first_sample + int(detector.detection_samples[i]))
+            last_detection = tuple(session.sample_time(index) for index in _last_window)
+            snr_db = float(detector.snr_db[-1, i]) if len(detector.snr_db) else float('nan')
+            event = DetectionEvent(freq, *last_detection, float(detector.peak_powers[i]), snr_db,
+                                   DETECT_CHANNEL, _last_window)
+            logger.info(f"Detected {freq} Hz! Energy = {int(event.peak_energy)}, "
+                        f"SNR = {snr_db:.1f} dB, latency = {event.duration * 1000:.0f} ms, "
+                        f"decided at t = {event.decision:.3f}")
+            yield event
+
+class _EitherEvent:
+    """Set when either of two threading.Events is, for detection_events() to poll"""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def is_set(self):
+        return self.first.is_set() or self.second.is_set()
+
+async def detection_events_async(threshold, session=None, cancel=None, timeout=None):
+    """Async iterator over detection_events(), reading the stream in a worker thread"""
+    # Our own token stops the worker; the caller's (e.g. the service shutdown event) is only read
+    stop = threading.Event()
+    events = detection_events(threshold, session, stop if cancel is None else _EitherEvent(stop, cancel), timeout)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            event = await loop.run_in_executor(None, next, events, None)
+            if event is None:
+                return
+            yield event
+    finally:
+        stop.set()  # Also stops the worker if the consumer was cancelled mid-read
 
-            energy = goertzel(samples)
-
-            if energy > (threshold/100):
-                counter += 1 
-                logger.info(f"Detected {TARGET_FREQ} Hz! Energy = {int(energy)}")
-
-            if counter > 12:
-                detected = True
-                break
+def detect(threshold, session=None, cancel=None, timeout=DETECT_TIMEOUT):
+    """Block until a tone is heard; False on timeout or cancellation"""
+    try:
+        for _ in detection_events(threshold, session, cancel, timeout):
+            return True
     except KeyboardInterrupt:
         logger.info("\nStopped by user")
-        return detected
-    finally:
-        process.terminate()
+    return False
 
-    return detected
+def detection_frames(session=None):
+    """All capture channels over the last detected tone (onset to decision), or None"""
+    session = session or get_session()
+    if _last_window is None:
+        return None
+    return session.window(*_last_window)
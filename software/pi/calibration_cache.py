@@ -0,0 +1,79 @@
+import glob
+import json
+import logging
+import os
+import time
+
+CACHE_FILE = "/home/hexapolo/project/calibration.json"
+MAX_AGE = 24 * 3600    # Seconds a cached calibration stays valid
+CARD_ID = "ArrayUAC10"  # ALSA card id of the mic array
+
+logger = logging.getLogger(__name__)
+
+
+def device_identity(card_id=CARD_ID):
+    """Identify the capture card by its ALSA id, USB vendor:product and bus position"""
+    for card_dir in glob.glob("/proc/asound/card[0-9]*"):
+        try:
+            with open(os.path.join(card_dir, "id")) as f:
+                if f.read().strip() != card_id:
+                    continue
+            fields = [card_id]
+            for name in ("usbid", "usbbus"):
+                path = os.path.join(card_dir, name)
+                if os.path.exists(path):
+                    with open(path) as f:
+                        fields.append(f.read().strip())
+            return ":".join(fields)
+        except OSError:
+            continue
+    return None
+
+
+def save_calibration(data, path=CACHE_FILE, device=None, timestamp=None):
+    """Write calibration data with a timestamp and device identity.
+
+    Pass the original `timestamp` when only refreshing online statistics, so
+    the cache still expires MAX_AGE after the last full calibration.
+    """
+    data = dict(data, timestamp=timestamp or time.time(), device=device or device_identity())
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)  # Never leave a half-written cache behind
+        logger.info(f"Calibration saved to {path}")
+    except OSError as e:
+        logger.warning(f"Could not save calibration to {path}: {e}")
+
+
+def load_calibration(path=CACHE_FILE, max_age=MAX_AGE, device=None, **expected):
+    """Return cached calibration data, or None if missing, stale or for other settings.
+
+    `expected` lists settings (sample rate, target frequencies...) that must
+    match the cached values for the calibration to be reused.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.info(f"No usable calibration cache at {path} ({e})")
+        return None
+
+    age = time.time() - data.get("timestamp", 0)
+    if not 0 <= age <= max_age:
+        logger.info(f"Calibration cache is {age / 3600:.1f} h old, recalibrating")
+        return None
+
+    device = device or device_identity()
+    if device is None or data.get("device") != device:
+        logger.info(f"Calibration cache was made on {data.get('device')}, not {device}")
+        return None
+
+    for key, value in expected.items():
+        if data.get(key) != value:
+            logger.info(f"Calibration cache has {key}={data.get(key)}, expected {value}")
+            return None
+
+    logger.info(f"Reusing calibration from {age / 60:.0f} min ago")
+    return data
@@ -0,0 +1,436 @@
+import logging
+import subprocess
+import threading
+import time
+import numpy as np
+from doa import MIC_CHANNELS, MIC_POSITIONS, SPEED_OF_SOUND
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+AUDIO_DEVICE = "default:CARD=ArrayUAC10"  # Find with: arecord -L
+DEVICE_NAME = "ReSpeaker 4 Mic Array"     # PortAudio name of the same card
+SAMPLE_RATE = 8000
+BUFFER_SECONDS = 5.0   # History kept in the ring buffer (pre-roll + reader slack)
+BLOCK_SIZE = 160       # Frames delivered by the device per block (20ms at 8kHz)
+MAX_READ = 8000        # Largest read served as a contiguous view (1s at 8kHz)
+NATIVE_RATES = (16000, 48000)  # Rates the card streams at when it refuses SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+class ArecordBackend:
+    """Capture through an arecord subprocess (fallback when PyAudio is missing)"""
+
+    def __init__(self, device=AUDIO_DEVICE, sample_rate=SAMPLE_RATE, channels=1, block_size=BLOCK_SIZE):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        # Preallocated block, exposed to the session as an int16 view
+        self._buffer = bytearray(block_size * channels * 2)
+        self._frames = np.frombuffer(self._buffer, dtype='<i2').reshape(block_size, channels)
+        self.process = None
+        self.thread = None
+
+    def start(self, on_block):
+        self.process = subprocess.Popen(
+            ["arecord", "-q", "-D", self.device, "-f", "S16_LE",
+             "-c", str(self.channels), "-r", str(self.sample_rate), "-t", "raw"],
+            stdout=subprocess.PIPE
+        )
+        self.thread = threading.Thread(target=self._run, args=(on_block,), daemon=True)
+        self.thread.start()
+
+    def _run(self, on_block):
+        """Thread function reading device blocks straight into the preallocated buffer"""
+        while True:
+            n = self.process.stdout.readinto(self._buffer)
+            if n < len(self._buffer):
+                break
+            on_block(self._frames)
+        on_block(None)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.wait()
+        if self.thread:
+            self.thread.join()
+
+
+class PyAudioBackend:
+    """In-process capture with a PortAudio callback, like usb_4_mic_array/test/rms.py.
+
+    The ReSpeaker only streams at its native 16 kHz, so when the device refuses
+    `sample_rate` the stream opens at the first of NATIVE_RATES that is a
+    multiple of it and the backend low-pass filters and decimates every block.
+    Blocks at the native rate are handed over as views of PortAudio's buffer.
+    """
+
+    def __init__(self, device_name=DEVICE_NAME, sample_rate=SAMPLE_RATE, channels=1, block_size=BLOCK_SIZE):
+        if pyaudio is None:
+            raise ImportError("pyaudio is not installed")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.pyaudio_instance = pyaudio.PyAudio()
+        self.on_block = None
+        try:
+            self._open(device_name)
+        except Exception:
+            self.pyaudio_instance.terminate()
+            raise
+
+    def _open(self, device_name):
+        device_index = None
+        for i in range(self.pyaudio_instance.get_device_count()):
+            dev = self.pyaudio_instance.get_device_info_by_index(i)
+            if device_name in dev['name'] and dev['maxInputChannels'] >= self.channels:
+                device_index = i
+                break
+
+        if device_index is None:
+            raise ValueError(f"Can not find an input device named {device_name} with {self.channels} channel(s)")
+
+        rates = [self.sample_rate] + [r for r in NATIVE_RATES if r > self.sample_rate and r % self.sample_rate == 0]
+        for rate in rates:
+            try:
+                self.pyaudio_instance.is_format_supported(
+                    rate, input_device=device_index, input_channels=self.channels, input_format=pyaudio.paInt16)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"{device_name} accepts none of the rates {rates}")
+
+        self.device_rate = rate
+        self.factor = rate // self.sample_rate
+        if self.factor > 1:
+            self._taps = decimation_taps(self.factor)
+            self._history = np.zeros((len(self._taps) - 1, self.channels))
+            self._phase = 0  # Offset in the next block of the next kept frame
+            logger.info(f"Capturing at {rate} Hz and decimating by {self.factor} to {self.sample_rate} Hz")
+
+        self.stream = self.pyaudio_instance.open(
+            start=False,
+            format=pyaudio.paInt16,
+            input_device_index=device_index,
+            channels=self.channels,
+            rate=rate,
+            frames_per_buffer=self.block_size * self.factor,
+            stream_callback=self._callback,
+            input=True
+        )
+
+    def _decimate(self, frames, stamp):
+        """Low-pass and keep every factor-th frame, carrying the filter history across blocks"""
+        delay = len(self._history)
+        buf = np.concatenate((self._history, frames))
+        windows = np.lib.stride_tricks.sliding_window_view(buf, len(self._taps), axis=0)
+        out = windows[self._phase::self.factor] @ self._taps
+        if stamp is not None:
+            # Output frames sit at the centre of their filter window
+            stamp += (self._phase - delay / 2) / self.device_rate
+        self._phase = (self._phase + len(out) * self.factor) - len(frames)
+        self._history = buf[len(frames):]
+        return np.clip(np.round(out), -32768, 32767).astype(np.int16), stamp
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        # ADC time of the first frame, moved from PortAudio's stream clock to time.monotonic()
+        lag = time_info['current_time'] - time_info['input_buffer_adc_time']
+        stamp = time.monotonic() - lag if 0 < lag < 1 else None
+        # View over PortAudio's buffer, no unpacking
+        frames = np.frombuffer(in_data, dtype='<i2').reshape(frame_count, self.channels)
+        if self.factor > 1:
+            if stamp is None:
+                stamp = time.monotonic() - frame_count / self.device_rate
+            frames, stamp = self._decimate(frames, stamp)
+        if len(frames):
+            self.on_block(frames, stamp)
+        return None, pyaudio.paContinue
+
+    def start(self, on_block):
+        self.on_block = on_block
+        self.stream.start_stream()
+
+    def stop(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio_instance.terminate()
+        self.on_block(None)
+
+
+def decimation_taps(factor, taps_per_phase=16):
+    """Hamming-windowed sinc low-pass for decimating by `factor` (cutoff at 0.9 of the new Nyquist)"""
+    n = np.arange(taps_per_phase * factor - 1) - (taps_per_phase * factor - 2) / 2
+    cutoff = 0.9 / factor
+    taps = cutoff * np.sinc(cutoff * n) * np.hamming(len(n))
+    return taps / taps.sum()
+
+
+class SyntheticBackend:
+    """Generated audio for running the audio path without the mic array.
+
+    The scene is a tone of `freq` Hz played during the `schedule` intervals
+    (stream seconds; set `tone_on` to override it), arriving from `angle`
+    degrees as a plane wave, plus independent white noise on every mic and
+    optional reverb (an exponentially decaying random tail of `rt60` seconds).
+    With 6 channels the layout follows the 6-channel firmware: raw mics on
+    channels 1-4 with their real delays, their mix on channel 0 standing in for
+    the processed channel, and silence on the playback channel 5.
+
+    With realtime=False no thread runs: the session pulls blocks as readers
+    need them, so the pipeline runs as fast as the CPU allows without overruns.
+    """
+
+    def __init__(self, sample_rate=SAMPLE_RATE, channels=1, block_size=BLOCK_SIZE, freq=1000,
+                 tone_level=3000, noise_level=300, schedule=((1.0, 2.0),), angle=0.0, rt60=0.0,
+                 duration=None, realtime=True, seed=0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self.freq = freq
+        self.tone_level = tone_level
+        self.noise_level = noise_level
+        self.schedule = list(schedule)
+        self.tone_on = None
+        self.duration = duration
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+
+        mics = 4 if channels == 6 else channels
+        positions = MIC_POSITIONS if channels == 6 else np.zeros((mics, 2))
+        u = np.array([np.cos(np.radians(angle)), np.sin(np.radians(angle))])
+        self.delays = -(positions @ u) / SPEED_OF_SOUND   # Arrival time of each mic vs the centre
+
+        # Reverb tail per mic, starting after the direct path, with half its energy
+        taps = int(rt60 * sample_rate)
+        if taps > 0:
+            t = np.arange(taps) / sample_rate
+            ir = self.rng.standard_normal((taps, mics)) * np.exp(-6.9 * t / rt60)[:, None]
+            ir[:int(0.002 * sample_rate)] = 0
+            self.ir = ir * np.sqrt(0.5 / np.maximum(np.square(ir).sum(axis=0), 1e-12))
+        else:
+            self.ir = np.zeros((0, mics))
+        self._tail = np.zeros((max(taps - 1, 0), mics))
+
+        self.position = 0
+        self.on_block = None
+        self.thread = None
+        self._stop = threading.Event()
+
+    def _gate(self, t):
+        if self.tone_on is not None:
+            return np.full(t.shape, float(self.tone_on))
+        on = np.zeros(t.shape)
+        for start, stop in self.schedule:
+            on[(t >= start) & (t < stop)] = 1.0
+        return on
+
+    def _generate(self, n):
+        t = (self.position + np.arange(n))[:, None] / self.sample_rate - self.delays[None, :]
+        mics = self.tone_level * self._gate(t) * np.sin(2 * np.pi * self.freq * t)
+        if len(self.ir):
+            wet = np.stack([np.convolve(mics[:, m], self.ir[:, m]) for m in range(mics.shape[1])], axis=1)
+            wet[:len(self._tail)] += self._tail
+            self._tail = wet[n:].copy()
+            mics = mics + wet[:n]
+        mics += self.noise_level * self.rng.standard_normal(mics.shape)
+        self.position += n
+
+        if self.channels == 6:
+            frames = np.zeros((n, 6))
+            frames[:, list(MIC_CHANNELS)] = mics
+            frames[:, 0] = mics.mean(axis=1)
+        else:
+            frames = mics
+        return np.clip(frames, -32768, 32767).astype(np.int16)
+
+    def pull(self):
+        """Generate the next block; returns False once `duration` is reached"""
+        if self.duration is not None and self.position >= self.duration * self.sample_rate:
+            self.on_block(None)
+            return False
+        self.on_block(self._generate(self.block_size))
+        return True
+
+    def start(self, on_block):
+        self.on_block = on_block
+        if self.realtime:
+            self._stop.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        """Thread function delivering blocks at the pace of a real device"""
+        period = self.block_size / self.sample_rate
+        next_block = time.monotonic()
+        while not self._stop.is_set() and self.pull():
+            next_block += period
+            self._stop.wait(max(0.0, next_block - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join()
+        elif self.on_block:
+            self.on_block(None)
+
+
+def make_backend(sample_rate=SAMPLE_RATE, channels=1, block_size=BLOCK_SIZE,
+                 device=AUDIO_DEVICE, device_name=DEVICE_NAME):
+    """Prefer in-process PortAudio capture and fall back to arecord"""
+    if pyaudio is not None:
+        try:
+            return PyAudioBackend(device_name, sample_rate, channels, block_size)
+        except (IOError, ValueError) as e:
+            logger.warning(f"PyAudio capture unavailable ({e}), falling back to arecord")
+    return ArecordBackend(device, sample_rate, channels, block_size)
+
+
+class CaptureSession:
+    """Long-lived audio capture owning a single device stream.
+
+    The backend keeps the device open for the life of the service and hands
+    every block to the session, which copies it into a preallocated ring
+    buffer. Consumers get a CaptureReader with its own position, so calibration
+    and detection can come and go (and even start slightly in the past, see
+    `preroll`) without reopening the device or losing the audio between calls.
+
+    The first MAX_READ frames of the ring are mirrored past its end, so any read
+    of up to MAX_READ frames is served as a view into the ring with no copy.
+    """
+
+    def __init__(self, backend=None, buffer_seconds=BUFFER_SECONDS, max_read=MAX_READ):
+        self.backend = backend or make_backend()
+        self.sample_rate = self.backend.sample_rate
+        self.channels = self.backend.channels
+        self.capacity = int(buffer_seconds * self.sample_rate)
+        self.max_read = max_read
+        self._ring = np.zeros((self.capacity + max_read, self.channels), dtype=np.int16)
+        self._cond = threading.Condition()
+        self.samples_written = 0
+        # Pull-mode backends (unthrottled synthetic audio) generate on demand in _read
+        self._pull = None if getattr(self.backend, "realtime", True) else self.backend.pull
+        self.start_time = None
+        # (sample index, time.monotonic()) of the newest block, so drift and overruns do not add up
+        self._anchor = (0, None)
+        self.running = False
+
+    def start(self):
+        """Open the device and start filling the ring buffer"""
+        self.start_time = time.monotonic()
+        self._anchor = (self.samples_written, self.start_time)
+        self.running = True
+        self.backend.start(self._append)
+        logger.info(f"Capture session started with {type(self.backend).__name__} "
+                    f"at {self.sample_rate} Hz, {self.channels} channel(s)")
+
+    def stop(self):
+        """Stop capturing and release the device"""
+        self.running = False
+        self.backend.stop()
+        logger.info("Capture session stopped")
+
+    def _append(self, frames, stamp=None):
+        """Backend callback: copy one block into the ring (None marks end of stream).
+
+        `stamp` is the time.monotonic() its first frame was captured at; without
+        one the block is assumed to have just been completed.
+        """
+        with self._cond:
+            if frames is None:
+                if self.running:
+                    logger.warning("Capture stream ended")
+                self.running = False
+                self._cond.notify_all()
+                return
+
+            n = len(frames)
+            if self._pull is not None:
+                stamp = self.start_time + self.samples_written / self.sample_rate  # Simulated time
+            elif stamp is None:
+                stamp = time.monotonic() - n / self.sample_rate
+            self._anchor = (self.samples_written, stamp)
+            pos = self.samples_written % self.capacity
+            first = min(n, self.capacity - pos)
+            self._ring[pos:pos + first] = frames[:first]
+            self._ring[:n - first] = frames[first:]
+            # Keep the mirror region past the end in sync with the head of the ring
+            for lo, hi in ((pos, pos + first), (0, n - first)):
+                hi = min(hi, self.max_read)
+                if lo < hi:
+                    self._ring[self.capacity + lo:self.capacity + hi] = self._ring[lo:hi]
+            self.samples_written += n
+            self._cond.notify_all()
+
+    def reader(self, preroll=0.0, channel=0):
+        """Return a reader of one channel starting `preroll` seconds before the newest sample.
+
+        channel=None reads all channels as (frames, channels) arrays.
+        """
+        with self._cond:
+            back = min(int(preroll * self.sample_rate), self.samples_written, self.capacity)
+            return CaptureReader(self, self.samples_written - back, channel)
+
+    def sample_time(self, index):
+        """Approximate time.monotonic() at which sample `index` was captured"""
+        anchor_index, anchor_time = self._anchor
+        return anchor_time + (index - anchor_index) / self.sample_rate
+
+    def window(self, start, stop):
+        """Copy of all channels of samples [start, stop), or None if no longer in the ring"""
+        with self._cond:
+            if start < self.samples_written - self.capacity or stop > self.samples_written:
+                return None
+            idx = np.arange(start, stop) % self.capacity
+            return self._ring[idx]
+
+    def _read(self, position, n, timeout):
+        if n > self.max_read:
+            raise ValueError(f"Cannot read more than {self.max_read} frames at once")
+        with self._cond:
+            if self._pull is not None:
+                while self.samples_written < position + n and self.running and self._pull():
+                    pass
+            self._cond.wait_for(
+                lambda: self.samples_written >= position + n or not self.running, timeout)
+            if self.samples_written < position + n:
+                return position, None
+
+            oldest = self.samples_written - self.capacity
+            if position < oldest:
+                logger.warning(f"Capture reader overrun, skipped {oldest - position} samples")
+                position = oldest
+
+            pos = position % self.capacity
+            return position + n, self._ring[pos:pos + n]
+
+
+class CaptureReader:
+    """Independent read cursor into a CaptureSession"""
+
+    def __init__(self, session, position, channel=0):
+        self.session = session
+        self.position = position
+        self.channel = channel
+
+    def read(self, n, timeout=None):
+        """Block until n samples are available and return them.
+
+        The result is a view into the session's ring buffer, valid until the
+        capture wraps around (BUFFER_SECONDS later); copy it to keep it longer.
+        Returns None if the stream ended or the timeout expired first.
+        """
+        self.position, frames = self.session._read(self.position, n, timeout)
+        if frames is None or self.channel is None:
+            return frames
+        return frames[:, self.channel]
+
+    @property
+    def time(self):
+        """Capture time of the next sample to be read"""
+        return self.session.sample_time(self.position)
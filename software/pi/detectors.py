@@ -0,0 +1,270 @@
+import math
+import logging
+import numpy as np
+from dsp import SlidingGoertzel, goertzel_bank_table, goertzel_omega
+
+logger = logging.getLogger(__name__)
+
+
+class NoiseFloor:
+    """Exponentially weighted per-bin noise power, updated from windows without a tone.
+
+    `reference` is the noise power measured at calibration time; `scale` tells
+    how much louder (or quieter) the room is now, so calibrated thresholds can
+    follow it without a full recalibration.
+    """
+
+    def __init__(self, reference, mean=None, alpha=0.005, min_scale=0.5, max_scale=8.0):
+        self.reference = np.array(reference, dtype=np.float64)
+        self.mean = np.array(reference if mean is None else mean, dtype=np.float64)
+        self.alpha = alpha
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+
+    def update(self, powers):
+        """Fold a (n, n_bins) block of noise-only powers into the running mean"""
+        n = len(powers)
+        if not n:
+            return
+        decay = 1.0 - self.alpha
+        weights = self.alpha * decay ** np.arange(n - 1, -1, -1)
+        self.mean = decay ** n * self.mean + weights @ powers
+
+    @property
+    def scale(self):
+        return np.clip(self.mean / np.maximum(self.reference, 1e-12), self.min_scale, self.max_scale)
+
+
+class Cfar:
+    """Cell-averaging CFAR over a sliding reference window of per-bin noise powers.
+
+    Each hop is compared with the mean of the last `reference_size` noise hops
+    and flagged when its SNR reaches `min_snr_db`. New hops only enter the
+    reference window after a delay of `guard_size` hops, and are dropped if a
+    tone shows up in the meantime, so the rising edge of a tone does not
+    inflate its own noise estimate. Sums are updated in O(1) per hop.
+    """
+
+    def __init__(self, n_bins, reference_size=200, guard_size=10, min_snr_db=15.0, seed=None):
+        self.reference_size = reference_size
+        self.guard_size = guard_size
+        self.min_snr_db = min_snr_db
+        self.min_snr = 10 ** (min_snr_db / 10)
+        self._ref = np.zeros((reference_size, n_bins))
+        self._pos = 0
+        self._count = 0
+        self._pending = []
+        if seed is not None:
+            self._ref[:] = np.asarray(seed, dtype=np.float64)
+            self._count = reference_size
+        self._recompute()
+
+    def _recompute(self):
+        self._sum = self._ref.sum(axis=0)
+        self._sumsq = np.square(self._ref).sum(axis=0)
+
+    def _push(self, row):
+        old = self._ref[self._pos]
+        self._sum += row - old
+        self._sumsq += row * row - old * old
+        self._ref[self._pos] = row
+        self._pos = (self._pos + 1) % self.reference_size
+        self._count = min(self._count + 1, self.reference_size)
+        if self._pos == 0:
+            self._recompute()  # Keep rounding errors of the running sums bounded
+
+    @property
+    def ready(self):
+        return self._count >= self.reference_size // 4
+
+    @property
+    def mean(self):
+        return self._sum / max(self._count, 1)
+
+    @property
+    def std(self):
+        return np.sqrt(np.maximum(self._sumsq / max(self._count, 1) - self.mean ** 2, 0.0))
+
+    def evaluate(self, powers):
+        """Return (hot, snr_db) arrays for a (n_hops, n_bins) block of powers"""
+        hot = np.zeros(powers.shape, dtype=bool)
+        snr_db = np.full(powers.shape, -np.inf)
+        for i, row in enumerate(powers):
+            if self.ready:
+                snr = row / np.maximum(self.mean, 1e-12)
+                snr_db[i] = 10 * np.log10(np.maximum(snr, 1e-12))
+                hot[i] = snr >= self.min_snr
+            if hot[i].any():
+                self._pending.clear()
+                continue
+            self._pending.append(row)
+            if len(self._pending) > self.guard_size:
+                self._push(self._pending.pop(0))
+        return hot, snr_db
+
+
+class VoteDetector:
+    """N-of-M decision per bin over the last M hops.
+
+    The last M per-hop decisions live in a fixed-size ring buffer and the count
+    of positive votes is updated incrementally, so each hop costs O(1)
+    whatever the window length.
+    """
+
+    def __init__(self, n_bins, n, m):
+        if not 0 < n <= m:
+            raise ValueError(f"Need 0 < n <= m, got n={n}, m={m}")
+        self.n = n
+        self.m = m
+        self._ring = np.zeros((m, n_bins), dtype=bool)
+        self.counts = np.zeros(n_bins, dtype=np.int64)
+        self._pos = 0
+
+    def reset(self):
+        self._ring[:] = False
+        self.counts[:] = 0
+        self._pos = 0
+
+    def update(self, votes):
+        """Push one hop of per-bin votes; return which bins have n votes out of the last m"""
+        self.counts += votes.astype(np.int64) - self._ring[self._pos]
+        self._ring[self._pos] = votes
+        self._pos = (self._pos + 1) % self.m
+        return self.counts >= self.n
+
+
+class FilterBankDetector:
+    """Detects several target tones at once from one vectorized filter bank.
+
+    Every hop the bank evaluates the targets plus their harmonics (and any extra
+    guard frequencies, e.g. other robots' tones) over the same window. A target
+    counts as present when its power is above its own threshold and at least
+    `min_purity` times stronger than its guard bins, which rejects broadband
+    noise that lights up the whole spectrum. A target is detected once it has
+    been present in enough hops to cover `min_duration` seconds out of a
+    window `1 / vote_fraction` times longer (N-of-M vote), so short dropouts
+    in the middle of a tone do not restart the count. With `rearm`, a target
+    can be detected again once its vote window holds no hot hop.
+
+    With a `noise_floor`, windows where no target is present keep updating it
+    and the thresholds are scaled by how much the room noise has drifted.
+    With a `cfar` stage the fixed thresholds are ignored and a target is
+    present when its SNR over the running noise estimate is high enough.
+    The target powers and SNR of the last block of hops are kept in `powers`
+    and `snr_db` for logging.
+
+    Blanked blocks (our own prompts playing) still advance the filter bank but
+    count as tone-free and are kept out of the noise estimates.
+    """
+
+    def __init__(self, targets, thresholds, sample_rate, chunk_size, hop=40, min_duration=0.3,
+                 harmonics=(2, 3), guards=(), min_purity=4.0, noise_floor=None, cfar=None,
+                 vote_fraction=0.8, rearm=False):
+        self.targets = list(targets)
+        self.thresholds = None if thresholds is None else np.broadcast_to(
+            np.asarray(thresholds, dtype=np.float64), (len(self.targets),)).copy()
+        self.sample_rate = sample_rate
+        self.hop = hop
+        self.min_duration = min_duration
+        self.min_purity = min_purity
+        self.noise_floor = noise_floor
+        self.cfar = cfar
+        self.rearm = rearm
+        self.powers = np.zeros((0, len(self.targets)))
+        self.snr_db = np.zeros((0, len(self.targets)))
+
+        # Bank layout: targets first, then harmonics and guards (deduplicated)
+        nyquist = sample_rate / 2
+        extra = [h * f for f in self.targets for h in harmonics if h * f < nyquist] + list(guards)
+        self.freqs = self.targets + [f for f in dict.fromkeys(extra) if f not in self.targets]
+        self.table = goertzel_bank_table(self.freqs, chunk_size, sample_rate)
+        self.sliding = SlidingGoertzel(self.table, hop)
+
+        # guard_mask[i, j]: bin j is compared against target i
+        omegas = np.array([goertzel_omega(f, chunk_size, sample_rate) for f in self.freqs])
+        n_targets = len(self.targets)
+        self.guard_mask = omegas[None, :] != omegas[:n_targets, None]
+
+        # A continuous tone covers min_duration (window included) after n hops
+        window_size = self.sliding.window_size
+        n = max(1, int(math.ceil((min_duration * sample_rate - window_size) / hop)) + 1)
+        self.vote = VoteDetector(n_targets, n, int(math.ceil(n / vote_fraction)))
+        self.reset()
+
+    def reset(self):
+        self.sliding.reset()
+        self.vote.reset()
+        n_targets = len(self.targets)
+        self.onset_samples = np.full(n_targets, -1, dtype=np.int64)
+        self.detection_samples = np.full(n_targets, -1, dtype=np.int64)
+        self.peak_powers = np.zeros(n_targets)
+        self.decisions = []  # (target, sample index) of every detection, in order
+
+    def feed(self, samples, blank=False):
+        """Feed samples; return the list of target frequencies newly detected"""
+        ends, powers = self.sliding.feed(samples)
+        if not len(ends):
+            self.powers = self.snr_db = np.zeros((0, len(self.targets)))
+            return []
+
+        n_targets = len(self.targets)
+        target_powers = self.powers = powers[:, :n_targets]
+        guard_powers = np.where(self.guard_mask[None, :, :], powers[:, None, :], 0.0).max(axis=2)
+        if blank:
+            above = np.zeros(target_powers.shape, dtype=bool)
+            self.snr_db = np.full(target_powers.shape, -np.inf)
+        elif self.cfar is not None:
+            above, self.snr_db = self.cfar.evaluate(target_powers)
+        else:
+            thresholds = self.thresholds
+            if self.noise_floor is not None:
+                thresholds = thresholds * self.noise_floor.scale
+                self.snr_db = 10 * np.log10(np.maximum(target_powers / self.noise_floor.mean, 1e-12))
+            above = target_powers > thresholds
+        hot = above & (target_powers >= self.min_purity * guard_powers)
+        if self.noise_floor is not None and not blank:
+            self.noise_floor.update(target_powers[~hot.any(axis=1)])
+
+        detected = []
+        for end, hot_row, power_row in zip(ends.tolist(), hot, target_powers):
+            voted = self.vote.update(hot_row)
+
+            # Onset and peak restart once the vote window holds no hot hop
+            idle = self.vote.counts == 0
+            self.onset_samples[idle] = -1
+            self.peak_powers[idle] = 0.0
+            if self.rearm:
+                self.detection_samples[idle] = -1
+            starting = hot_row & (self.onset_samples < 0)
+            self.onset_samples[starting] = end - self.sliding.window_size
+            self.peak_powers = np.where(hot_row, np.maximum(self.peak_powers, power_row), self.peak_powers)
+
+            for i in np.flatnonzero(voted & (self.detection_samples < 0)):
+                self.detection_samples[i] = end
+                self.decisions.append((self.targets[i], end))
+                detected.append(self.targets[i])
+                logger.debug(f"{self.targets[i]} Hz detected at sample {end}, "
+                             f"peak energy = {int(self.peak_powers[i])}")
+        return detected
+
+    def decision_time(self, target):
+        """Stream time (seconds since the first sample fed) target was detected at, or None"""
+        i = self.targets.index(target)
+        if self.detection_samples[i] < 0:
+            return None
+        return self.detection_samples[i] / self.sample_rate
+
+    def onset_time(self, target):
+        """Stream time of the estimated onset of target, or None"""
+        i = self.targets.index(target)
+        if self.onset_samples[i] < 0:
+            return None
+        return self.onset_samples[i] / self.sample_rate
+
+    def latency(self, target):
+        """Seconds between the estimated onset and the detection of target, or None"""
+        i = self.targets.index(target)
+        if self.detection_samples[i] < 0:
+            return None
+        return (self.detection_samples[i] - self.onset_samples[i]) / self.sample_rate
+
@@ -0,0 +1,222 @@
+import math
+import time
+import logging
+import threading
+from itertools import combinations
+import numpy as np
+
+SPEED_OF_SOUND = 343.0
+# Raw microphones of the ReSpeaker USB 4 Mic Array: channels 1-4 of the
+# 6-channel firmware, positions in metres (same layout as odas.cfg)
+MIC_CHANNELS = (1, 2, 3, 4)
+MIC_POSITIONS = np.array([
+    [-0.032, +0.000],
+    [+0.000, -0.032],
+    [+0.032, +0.000],
+    [+0.000, +0.032],
+])
+SAMPLER_RATE = 50      # DOAANGLE / VOICEACTIVITY polls per second
+SAMPLER_SECONDS = 10   # History kept by the sampler
+
+logger = logging.getLogger(__name__)
+
+
+def circular_stats(angles, weights=None):
+    """Circular mean and spread (circular standard deviation) of angles in degrees"""
+    radians = np.radians(angles)
+    c = np.average(np.cos(radians), weights=weights)
+    s = np.average(np.sin(radians), weights=weights)
+    resultant = min(math.hypot(c, s), 1.0)
+    spread = min(math.degrees(math.sqrt(-2 * math.log(resultant))), 180.0) if resultant > 0 else 180.0
+    return math.degrees(math.atan2(s, c)) % 360, spread
+
+
+class DoaSampler:
+    """Polls the XMOS DOA angle and voice activity in the background.
+
+    Every poll is stored with its time.monotonic() stamp in a fixed-size ring,
+    so once a tone has been detected its direction can be taken from the
+    samples polled while it was actually playing rather than from a single
+    read after the fact (which may catch silence or our own reply).
+    """
+
+    def __init__(self, tuning, rate=SAMPLER_RATE, seconds=SAMPLER_SECONDS):
+        self.tuning = tuning
+        self.period = 1.0 / rate
+        self.capacity = int(rate * seconds)
+        self.times = np.full(self.capacity, -np.inf)
+        self.angles = np.zeros(self.capacity, dtype=np.int16)
+        self.voice = np.zeros(self.capacity, dtype=bool)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        self._stop.clear()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.thread:
+            self.thread.join()
+        self.running = False
+
+    def _run(self):
+        next_poll = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                angle = self.tuning.direction
+                voice = self.tuning.is_voice()
+                stamp = time.monotonic()
+                with self._lock:
+                    i = self.count % self.capacity
+                    self.times[i], self.angles[i], self.voice[i] = stamp, angle, voice
+                    self.count += 1
+                # Fixed-rate schedule; skip missed polls instead of bursting to catch up
+                next_poll = max(next_poll + self.period, stamp)
+                self._stop.wait(next_poll - time.monotonic())
+        except Exception as e:
+            logger.error(f"DOA sampler stopped: {e}")
+        self.running = False
+
+    def latest(self):
+        """Most recent (time, angle, voice), or None before the first poll"""
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self.count - 1) % self.capacity
+            return float(self.times[i]), int(self.angles[i]), bool(self.voice[i])
+
+    def window(self, start, stop):
+        """(angles, voice) polled between the monotonic times start and stop"""
+        with self._lock:
+            mask = (self.times >= start) & (self.times <= stop)
+            return self.angles[mask].copy(), self.voice[mask].copy()
+
+    def stats(self, start, stop, voice_only=True):
+        """(circular mean, spread, n) of the angles polled in [start, stop], or None.
+
+        With voice_only, polls where the array flagged voice activity are
+        preferred, falling back to all polls if there are none.
+        """
+        angles, voice = self.window(start, stop)
+        if voice_only and voice.any():
+            angles = angles[voice]
+        if not len(angles):
+            return None
+        mean, spread = circular_stats(angles)
+        return mean, spread, len(angles)
+
+
+class GccPhatDoa:
+    """Direction of arrival from the raw mic channels with vectorized GCC-PHAT.
+
+    The signal is cut into overlapping Hann-windowed frames, the cross-spectra
+    of all mic pairs are accumulated over the frames, PHAT-weighted and turned
+    back into (interpolated) cross-correlations in one inverse FFT. The best lag
+    of every pair gives its time difference of arrival and a least-squares fit
+    of those delays against the array geometry gives the direction.
+
+    `freq_range` limits the correlation to a band around the target tone and
+    `beta` is the PHAT exponent: 1 whitens fully (sharpest peaks on broadband
+    sounds, robust to reverb), lower values keep more weight on the strong
+    bins, which is what a narrowband tone in noise needs.
+    """
+
+    def __init__(self, sample_rate=16000, frame_size=512, mic_positions=MIC_POSITIONS,
+                 interp=4, freq_range=None, beta=0.6, speed_of_sound=SPEED_OF_SOUND):
+        self.sample_rate = sample_rate
+        self.frame_size = frame_size
+        self.interp = interp
+        self.beta = beta
+        self.speed_of_sound = speed_of_sound
+        self.mic_positions = np.asarray(mic_positions, dtype=np.float64)
+
+        pairs = np.array(list(combinations(range(len(self.mic_positions)), 2)))
+        self.pair_i, self.pair_j = pairs[:, 0], pairs[:, 1]
+        # Plane wave from unit direction u: t_i - t_j = (p_j - p_i) . u / c
+        self.baselines = self.mic_positions[self.pair_j] - self.mic_positions[self.pair_i]
+        self._pinv = np.linalg.pinv(self.baselines)
+
+        self.n_fft = 2 * frame_size
+        self.n_corr = self.n_fft * interp
+        max_tau = np.linalg.norm(self.baselines, axis=1).max() / speed_of_sound
+        self.max_shift = int(math.ceil(max_tau * sample_rate * interp))
+        self.window = np.hanning(frame_size)
+
+        freqs = np.fft.rfftfreq(self.n_fft, 1.0 / sample_rate)
+        self.band = np.ones(len(freqs), dtype=bool) if freq_range is None else \
+            (freqs >= freq_range[0]) & (freqs <= freq_range[1])
+        # irfft weights of lag 0, where a perfectly coherent pair would peak
+        self._lag0 = np.where(np.arange(len(freqs)) == 0, 1.0, 2.0) / self.n_corr
+
+    def _frames(self, signal):
+        hop = self.frame_size // 2
+        n = 1 + max(0, (len(signal) - self.frame_size) // hop)
+        if len(signal) < self.frame_size:
+            signal = np.pad(signal, ((0, self.frame_size - len(signal)), (0, 0)))
+        idx = np.arange(self.frame_size)[None, :] + hop * np.arange(n)[:, None]
+        return signal[idx] * self.window[None, :, None]
+
+    def delays(self, signal):
+        """Per-pair time differences (s) and GCC-PHAT peak heights normalized to [0, 1]"""
+        frames = self._frames(np.asarray(signal, dtype=np.float64))
+        spectra = np.fft.rfft(frames, n=self.n_fft, axis=1)                  # (frames, bins, mics)
+        cross = (spectra[:, :, self.pair_i] * np.conj(spectra[:, :, self.pair_j])).sum(axis=0)
+        cross[~self.band] = 0
+        cross /= np.maximum(np.abs(cross), 1e-12) ** self.beta               # PHAT weighting
+        corr = np.fft.irfft(cross, n=self.n_corr, axis=0)                     # (lags, pairs)
+        corr = np.concatenate([corr[-self.max_shift:], corr[:self.max_shift + 1]])
+        best = corr.argmax(axis=0)
+        coherent = np.maximum(self._lag0 @ np.abs(cross), 1e-12)
+        peaks = corr[best, np.arange(corr.shape[1])] / coherent
+        taus = (best - self.max_shift) / (self.sample_rate * self.interp)
+        return taus, peaks
+
+    def estimate(self, signal):
+        """Return (angle in degrees, confidence in [0, 1]) for a (frames, mics) block"""
+        taus, peaks = self.delays(signal)
+        direction = self._pinv @ (taus * self.speed_of_sound)
+        angle = math.degrees(math.atan2(direction[1], direction[0])) % 360
+
+        # Confident when every pair correlates well and the delays agree with one direction
+        unit = direction / max(np.linalg.norm(direction), 1e-12)
+        residual = np.sqrt(np.mean((self.baselines @ unit / self.speed_of_sound - taus) ** 2))
+        max_tau = self.max_shift / (self.sample_rate * self.interp)
+        consistency = max(0.0, 1.0 - residual / max_tau)
+        confidence = float(np.clip(peaks.mean(), 0.0, 1.0) * consistency)
+        return angle, confidence
+
+
+def simulate(angle, duration=0.3, sample_rate=16000, freq=1000, noise=0.1, mic_positions=MIC_POSITIONS):
+    """Plane-wave tone arriving from `angle` degrees on every mic, with white noise"""
+    n = int(duration * sample_rate)
+    u = np.array([math.cos(math.radians(angle)), math.sin(math.radians(angle))])
+    delays = -(np.asarray(mic_positions) @ u) / SPEED_OF_SOUND
+    t = np.arange(n)[:, None] / sample_rate - delays[None, :]
+    rng = np.random.default_rng(0)
+    return np.sin(2 * np.pi * freq * t) + noise * rng.standard_normal(t.shape)
+
+
+def benchmark(durations=(0.1, 0.3, 1.0), repeats=20, sample_rate=16000):
+    """Time GCC-PHAT on detection windows of several lengths (run this on the Pi)"""
+    doa = GccPhatDoa(sample_rate, freq_range=(900, 1100))
+    print(f"{'window':>8} {'ms/estimate':>12} {'CPU %':>7} {'angle':>7} {'conf':>6}")
+    for duration in durations:
+        signal = simulate(60, duration, sample_rate)
+        doa.estimate(signal)  # warm up FFT plans and caches
+        start = time.process_time()
+        for _ in range(repeats):
+            angle, confidence = doa.estimate(signal)
+        cost = (time.process_time() - start) / repeats
+        # CPU % if one estimate ran for every window of audio
+        print(f"{duration:>7.1f}s {cost * 1000:>12.2f} {100 * cost / duration:>7.1f} "
+              f"{angle:>7.1f} {confidence:>6.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
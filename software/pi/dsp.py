@@ -0,0 +1,109 @@
+import math
+import numpy as np
+
+# Shared Goertzel helpers for the tone detector.
+#
+# The Goertzel power of a block x[0..N-1] at bin omega is |sum x[n] e^{-j omega n}|^2,
+# so instead of running the recurrence sample by sample we project every chunk
+# onto a precomputed (cos, sin) table with a single matrix product.
+
+
+def goertzel_omega(target_freq, chunk_size, sample_rate):
+    """Angular frequency of the DFT bin closest to target_freq"""
+    k = int(0.5 + ((chunk_size * target_freq) / sample_rate))
+    return (2.0 * math.pi * k) / chunk_size
+
+
+def goertzel_coeff(target_freq, chunk_size, sample_rate):
+    """Recurrence coefficient used by the scalar Goertzel loop"""
+    return 2.0 * math.cos(goertzel_omega(target_freq, chunk_size, sample_rate))
+
+
+def goertzel_bank_table(target_freqs, chunk_size, sample_rate):
+    """Precompute the (chunk_size, 2 * n_bins) projection table for several bins.
+
+    The first n_bins columns hold the cosines and the last n_bins the sines, so a
+    single-bin table is simply [cos, sin].
+    """
+    omegas = np.array([goertzel_omega(f, chunk_size, sample_rate) for f in target_freqs])
+    n = np.outer(np.arange(chunk_size), omegas)
+    return np.concatenate([np.cos(n), np.sin(n)], axis=1)
+
+
+def goertzel_table(target_freq, chunk_size, sample_rate):
+    """Precompute the (chunk_size, 2) cos/sin projection table for one bin"""
+    return goertzel_bank_table([target_freq], chunk_size, sample_rate)
+
+
+def goertzel_bank_powers(chunks, table):
+    """Powers of every bin for every chunk, as a (n_chunks, n_bins) array"""
+    chunks = np.asarray(chunks, dtype=np.float64).reshape(-1, table.shape[0])
+    proj = chunks @ table
+    n_bins = table.shape[1] // 2
+    return proj[:, :n_bins]**2 + proj[:, n_bins:]**2
+
+
+def goertzel_powers(chunks, table):
+    """Goertzel power of every row of a 2-D (n_chunks, chunk_size) array"""
+    return goertzel_bank_powers(chunks, table)[:, 0]
+
+
+def goertzel(samples, table):
+    """Goertzel power of a single chunk (streaming entry point)"""
+    proj = np.asarray(samples, dtype=np.float64) @ table
+    return float(proj @ proj)
+
+
+def goertzel_scalar(samples, coeff):
+    """Reference per-sample Goertzel recurrence (slow, kept for comparisons)"""
+    s_prev = 0.0
+    s_prev2 = 0.0
+    for sample in samples:
+        s = sample + coeff * s_prev - s_prev2
+        s_prev2 = s_prev
+        s_prev = s
+    power = s_prev2**2 + s_prev**2 - coeff * s_prev * s_prev2
+    return power
+
+
+class SlidingGoertzel:
+    """Goertzel power over the last window of samples, evaluated every hop samples.
+
+    Works with single-bin and bank tables alike; powers come back as
+    (n_hops, n_bins).
+    """
+
+    def __init__(self, table, hop):
+        self.table = table
+        self.window_size = table.shape[0]
+        self.hop = hop
+        self.samples_seen = 0
+        self._tail = np.zeros(0)
+
+    def reset(self):
+        self.samples_seen = 0
+        self._tail = np.zeros(0)
+
+    def feed(self, samples):
+        """Push new samples and return (end_indices, powers) for every completed hop.
+
+        end_indices are absolute sample counts (exclusive end of each window) since
+        the first sample fed, so results do not depend on how the input is blocked.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        buf = np.concatenate([self._tail, samples])
+        start = self.samples_seen - len(self._tail)
+        total = self.samples_seen + len(samples)
+
+        # Windows end on a fixed grid of multiples of hop
+        first = max(-(-self.window_size // self.hop), self.samples_seen // self.hop + 1) * self.hop
+        ends = np.arange(first, total + 1, self.hop)
+        if len(ends):
+            windows = np.lib.stride_tricks.sliding_window_view(buf, self.window_size)
+            powers = goertzel_bank_powers(windows[ends - self.window_size - start], self.table)
+        else:
+            powers = np.zeros((0, self.table.shape[1] // 2))
+
+        self._tail = buf[-(self.window_size - 1):] if self.window_size > 1 else np.zeros(0)
+        self.samples_seen = total
+        return ends, powers
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import queue
+import logging
+import multiprocessing
+import numpy as np
+from play_wav import sounding
+
+try:
+    import vosk
+except ImportError:
+    vosk = None
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model")
+KEYWORD = "polo"
+GATE_HOP = 0.02        # Seconds per energy measurement of the pre-gate
+GATE_RATIO_DB = 10.0   # Energy above the noise floor that opens the gate
+GATE_HANGOVER = 0.3    # Seconds the gate stays open after the energy drops
+GATE_PREROLL = 0.3     # Seconds before the gate opened sent along (word onsets are quiet)
+MAX_UTTERANCE = 1.5    # Longest segment sent to the recognizer (a "Polo" is well under that)
+NOISE_ALPHA = 0.02     # EMA rate of the noise floor while the gate is closed
+READ_TIMEOUT = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+def _recognizer_worker(model_dir, sample_rate, grammar, requests, results):
+    """Worker process: run Vosk with a restricted grammar on each segment it is sent"""
+    vosk.SetLogLevel(-1)
+    recognizer = vosk.KaldiRecognizer(vosk.Model(model_dir), sample_rate, json.dumps(grammar))
+    results.put(("ready", None, 0.0, time.monotonic()))
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        segment_id, pcm = request
+        start = time.process_time()
+        recognizer.AcceptWaveform(pcm)
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        recognizer.Reset()
+        results.put((segment_id, text, time.process_time() - start, time.monotonic()))
+
+
+class KeywordEvent:
+    """A recognized keyword, with time.monotonic() stamps like DetectionEvent"""
+
+    def __init__(self, text, onset, decision, window, latency):
+        self.text = text
+        self.onset = onset
+        self.decision = decision
+        self.duration = decision - onset
+        self.window = window    # (start, stop) capture sample indices of the segment
+        self.latency = latency  # Seconds from the end of the segment to the recognizer's answer
+
+    def __repr__(self):
+        return f"KeywordEvent({self.text!r}, onset={self.onset:.3f}, latency={self.latency * 1000:.0f} ms)"
+
+
+class KeywordSpotter:
+    """Two-stage keyword spotting: an energy pre-gate in process, Vosk in a worker process.
+
+    The gate tracks the noise floor and only sends segments louder than it (plus
+    a little pre-roll) to the recognizer, which uses a grammar restricted to the
+    keyword, so full ASR never runs on silence. Running in another process keeps
+    the recognizer off the GIL of the detection and DOA code.
+    """
+
+    def __init__(self, session, keyword=KEYWORD, model_dir=MODEL_DIR, channel=0, echo_gate=True):
+        if vosk is None:
+            raise ImportError("vosk is not installed")
+        self.session = session
+        self.keyword = keyword
+        self.channel = channel
+        self.echo_gate = echo_gate  # Keep the gate shut while our own prompts play
+        self.sample_rate = session.sample_rate
+        context = multiprocessing.get_context("spawn")  # Do not fork the capture threads
+        self.requests = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=_recognizer_worker, daemon=True,
+            args=(model_dir, self.sample_rate, [keyword, "[unk]"], self.requests, self.results))
+        # Segments outlive the events() call that sent them, so ids and windows live here
+        self._pending = {}     # segment id -> (generation, (start, stop) sample indices)
+        self._next_id = 0
+        self._generation = 0   # Bumped by every events() call
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.audio_seconds = 0.0
+        self.gated_seconds = 0.0
+        self.worker_cpu = 0.0
+        self.segments = 0
+        self.latencies = []
+        self.started = time.monotonic()
+
+    def start(self, timeout=30):
+        """Start the worker and wait for the model to load"""
+        self.process.start()
+        self.results.get(timeout=timeout)
+        logger.info(f"Keyword spotter ready for {self.keyword!r}")
+
+    def stop(self):
+        self.requests.put(None)
+        self.process.join(timeout=5)
+        stats = self.stats()
+        logger.info(f"Keyword spotter: gate open {100 * stats['gate_fraction']:.1f}% of the time, "
+                    f"worker CPU duty cycle {100 * stats['duty_cycle']:.1f}%, "
+                    f"added latency {stats['mean_latency'] * 1000:.0f} ms over {stats['segments']} segments")
+
+    def stats(self):
+        wall = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "audio_seconds": self.audio_seconds,
+            "gate_fraction": self.gated_seconds / max(self.audio_seconds, 1e-9),
+            "duty_cycle": self.worker_cpu / wall,
+            "segments": self.segments,
+            "mean_latency": float(np.mean(self.latencies)) if self.latencies else float('nan'),
+        }
+
+    def events(self, cancel=None, timeout=None):
+        """Yield a KeywordEvent each time the keyword is recognized; stops like detection_events()"""
+        hop = int(GATE_HOP * self.sample_rate)
+        ratio = 10 ** (GATE_RATIO_DB / 10)
+        reader = self.session.reader(preroll=GATE_PREROLL, channel=self.channel)
+        noise = None
+        open_since = None
+        last_loud = None
+        self._generation += 1
+        generation = self._generation
+        start_time = time.monotonic()
+
+        while not (cancel is not None and cancel.is_set()):
+            if timeout is not None and time.monotonic() - start_time >= timeout:
+                break
+
+            # Collect the recognizer's answers without blocking the audio loop
+            while True:
+                try:
+                    segment_id, text, cpu, done = self.results.get_nowait()
+                except queue.Empty:
+                    break
+                sent_by, window = self._pending.pop(segment_id)
+                self.worker_cpu += cpu
+                latency = done - self.session.sample_time(window[1])
+                self.latencies.append(latency)
+                if sent_by != generation:
+                    continue  # Answer to an earlier listening call, the speaker may have moved
+                if self.keyword in text.split():
+                    event = KeywordEvent(text, *(self.session.sample_time(i) for i in window), window, latency)
+                    logger.info(f"Heard {event}")
+                    yield event
+
+            position = reader.position
+            samples = reader.read(hop, timeout=READ_TIMEOUT)
+            if samples is None:
+                if not self.session.running:
+                    break
+                continue
+            self.audio_seconds += hop / self.sample_rate
+
+            if self.echo_gate and sounding(self.session.sample_time(position),
+                                           self.session.sample_time(position + hop)):
+                loud = False  # Our own prompt, neither speech nor room noise
+            else:
+                energy = float(np.mean(np.square(samples, dtype=np.float64)))
+                loud = noise is not None and energy > ratio * noise
+                if noise is None:
+                    noise = energy
+                elif open_since is None and not loud:
+                    noise += NOISE_ALPHA * (energy - noise)
+
+            if loud:
+                last_loud = position + hop
+                if open_since is None:
+                    open_since = max(position - int(GATE_PREROLL * self.sample_rate), 0)
+            if open_since is None:
+                continue
+
+            self.gated_seconds += hop / self.sample_rate
+            end = position + hop
+            closing = end - last_loud >= GATE_HANGOVER * self.sample_rate
+            if closing or end - open_since >= MAX_UTTERANCE * self.sample_rate:
+                segment = self.session.window(open_since, end)
+                if segment is not None:
+                    self._pending[self._next_id] = (generation, (open_since, end))
+                    self.requests.put((self._next_id, segment[:, self.channel].tobytes()))
+                    self.segments += 1
+                    self._next_id += 1
+                open_since = None
@@ -3,15 +3,18 @@ import logging
 import signal
 import subprocess
 import sys
-from audio import get_doa_angle
-from play_wav import play_wav
-from basic_movement import forward, turn
+import threading
+from audio import get_doa_angle, get_sampler, close_sampler, close_spotter
+from play_wav import play_wav, get_player, close_player
+from basic_movement import forward, turn, halt, close_executor
 from read_from_serial import SerialReader
-from calibrate_and_detect import calibrate
+from calibrate_and_detect import load_or_calibrate, save_noise_floor, close_session
 
 # Global flag for graceful shutdown
 shutdown_flag = False
 continue_follow = False
+# Set with shutdown_flag so listening stops right away instead of at the next detection
+shutdown_event = threading.Event()
 
 def setup_logging():
     """Setup logging configuration for service operation"""
@@ -31,6 +34,7 @@ def signal_handler(signum, frame):
     logger = logging.getLogger(__name__)
     logger.info(f"Received signal {signum}, initiating graceful shutdown...")
     shutdown_flag = True
+    shutdown_event.set()
     continue_follow = False
 
 # Setup signal handlers
@@ -49,12 +53,13 @@ def handle_command(command):
             if direction == "stop":
                 logger.info("Received STOP command, stopping follow mode")
                 continue_follow = False 
+                halt()
             else:
                 angle = float(cmd[1])  # Convert angle to float
                 if direction == 'left':
                     angle *= -1
                 logger.info(f"Executing turn command: {direction} {angle}°")
-                turn(angle)
+                turn(angle, wait=False)  # Replaces the turn in progress, if any
         else:
             logger.warning(f"Invalid command format: {command}")
     except Exception as e:
@@ -72,8 +77,10 @@ def follow():
 
     try:
         logger.info("Follow mode active - robot will move forward and respond to turn commands")
+        walk = None
         while continue_follow and not shutdown_flag:
-            forward(0.5)
+            if walk is None or walk.remaining < 0.2:
+                walk = forward(0.5, wait=False)  # Extended before it runs out, so walking never pauses
             sleep(0.1)  # Small delay to check flags more frequently
     except KeyboardInterrupt:
         logger.info("Follow mode interrupted by user")
@@ -81,6 +88,7 @@ def follow():
         logger.error(f"Error in follow mode: {e}")
     finally:
         logger.info("Stopping follow mode and closing serial connection")
+        halt()
         serial_reader.send_message("stop")
         serial_reader.stop()
 
@@ -93,8 +101,9 @@ def main_control_loop(threshold):
     try:
         while not shutdown_flag:
             try:
-                play_wav(path="/home/hexapolo/project/Marco.wav")
-                doa = get_doa_angle(threshold)
+                # Listen right away; the detector ignores the prompt while it plays
+                play_wav(path="/home/hexapolo/project/Marco.wav", block=False)
+                doa = get_doa_angle(threshold, cancel=shutdown_event)
                 if not doa:
                     logger.info("DOA loop interrupted, stopping main loop")
                     break
@@ -125,11 +134,21 @@ if __name__ == "__main__":
     logger.info("Robot Control Service Starting...")
     logger.info("System: ESP32 Camera -> Laptop CV -> ESP32 -> Pi Robot Control")
 
+    threshold = None
     try:
-        threshold = calibrate()
+        get_player()   # Decode the prompts and open the output stream once
+        get_sampler()  # Apply the mic profile before calibrating against its output
+        threshold = load_or_calibrate()
         main_control_loop(threshold)
     except Exception as e:
         logger.error(f"Fatal error in robot control service: {e}")
         sys.exit(1)
     finally:
+        if threshold is not None:
+            save_noise_floor(threshold)
+        close_spotter()
+        close_sampler()
+        close_session()
+        close_player()
+        close_executor()
         logger.info("Robot Control Service Stopped")
@@ -1,6 +1,292 @@
+import os
+import math
 import subprocess
+import threading
+import time
+import wave
+import logging
+import numpy as np
+from collections import deque
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
 
 AUDIO_DEVICE = "default:CARD=ArrayUAC10"  # Find with: arecord -L
+DEVICE_NAME = "ReSpeaker 4 Mic Array"     # PortAudio name of the same card
+PROMPT_DIR = "/home/hexapolo/project"
+PROMPTS = ["Marco.wav", "hear.wav", "found.wav", "game.wav", "cal.wav", "3.wav", "2.wav", "1.wav"]
+OUTPUT_RATES = (16000, 48000, 44100, 22050)  # Tried in order until the device accepts one
+BLOCK_SIZE = 256       # Frames per output callback (16ms at 16kHz)
+HISTORY = 100          # Finished prompts kept for the time-to-first-sample stats
+ECHO_TAIL = 0.15       # Seconds a prompt keeps ringing in the room after its last sample
+APLAY_DELAY = 0.3      # Upper bound of aplay's startup when we cannot see its first sample
+
+logger = logging.getLogger(__name__)
+
+_player = None
+_player_failed = False  # Do not retry opening the device on every prompt
+_timeline = deque(maxlen=HISTORY)  # Playbacks of every prompt, for self-echo gating
+
+
+def decode_wav(path, sample_rate, channels):
+    """Read a WAV file as an int16 (frames, channels) array at sample_rate"""
+    with wave.open(path, 'rb') as wf:
+        width, n_channels, rate = wf.getsampwidth(), wf.getnchannels(), wf.getframerate()
+        raw = wf.readframes(wf.getnframes())
+
+    if width == 1:
+        # 8-bit WAV is unsigned
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2')
+    elif width == 4:
+        samples = (np.frombuffer(raw, dtype='<i4') >> 16).astype(np.int16)
+    else:
+        raise ValueError(f"Unsupported sample width {width} in {path}")
+    mono = samples.reshape(-1, n_channels).mean(axis=1)
+
+    if rate != sample_rate:
+        n = int(len(mono) * sample_rate / rate)
+        mono = np.interp(np.arange(n) * rate / sample_rate, np.arange(len(mono)), mono)
+    return np.repeat(np.round(mono).astype(np.int16)[:, None], channels, axis=1)
+
+
+class Playback:
+    """Handle of one queued prompt, with time.monotonic() stamps of when it is heard"""
+
+    def __init__(self, path, duration, samples=None):
+        self.path = path
+        self.samples = samples
+        self.duration = duration
+        self.position = 0
+        self.requested = time.monotonic()
+        self.start = None   # First sample at the DAC
+        self.end = None     # Last sample at the DAC
+        self._handed_over = threading.Event()
+
+    @property
+    def time_to_first_sample(self):
+        return None if self.start is None else self.start - self.requested
+
+    def done(self):
+        return self.end is not None and time.monotonic() >= self.end
+
+    def wait(self, timeout=None):
+        """Block until the prompt has finished sounding; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self._handed_over.wait(timeout):
+            return False
+        remaining = self.end - time.monotonic()
+        if deadline is not None:
+            remaining = min(remaining, deadline - time.monotonic())
+        if remaining > 0:
+            time.sleep(remaining)
+        return self.done()
+
+
+class PromptPlayer:
+    """Plays prompts decoded into memory on one output stream kept open for the life of the service.
+
+    The stream runs continuously (silence when idle), so a prompt only waits
+    for the next output callback instead of an aplay fork/exec and ALSA open.
+    Prompts are queued and played one after the other.
+    """
+
+    def __init__(self, prompts=(), device_name=DEVICE_NAME, block_size=BLOCK_SIZE):
+        if pyaudio is None:
+            raise ImportError("pyaudio is not installed")
+        self.pyaudio_instance = pyaudio.PyAudio()
+        try:
+            self._open(device_name, block_size)
+        except Exception:
+            self.pyaudio_instance.terminate()
+            raise
+        self.cache = {}
+        self.queue = []
+        self.history = deque(maxlen=HISTORY)
+        self._lock = threading.Lock()
+        for path in prompts:
+            try:
+                self.load(path)
+            except (OSError, ValueError, wave.Error) as e:
+                logger.warning(f"Prompt {path} not cached: {e}")
+        self.stream.start_stream()
+        logger.info(f"Prompt player ready at {self.sample_rate} Hz, {self.channels} channel(s), "
+                    f"{len(self.cache)} prompt(s) cached")
+
+    def _open(self, device_name, block_size):
+        device_index = None
+        for i in range(self.pyaudio_instance.get_device_count()):
+            dev = self.pyaudio_instance.get_device_info_by_index(i)
+            if device_name in dev['name'] and dev['maxOutputChannels'] >= 1:
+                device_index = i
+                break
+        if device_index is None:
+            raise ValueError(f"Can not find an output device named {device_name}")
+
+        channels = min(2, int(dev['maxOutputChannels']))
+        for rate in OUTPUT_RATES:
+            try:
+                self.pyaudio_instance.is_format_supported(
+                    rate, output_device=device_index, output_channels=channels, output_format=pyaudio.paInt16)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"{device_name} accepts none of the rates {OUTPUT_RATES}")
+
+        self.sample_rate = rate
+        self.channels = channels
+        self._out = np.zeros((block_size, channels), dtype=np.int16)
+        self.stream = self.pyaudio_instance.open(
+            start=False,
+            format=pyaudio.paInt16,
+            output_device_index=device_index,
+            channels=channels,
+            rate=rate,
+            frames_per_buffer=block_size,
+            stream_callback=self._callback,
+            output=True
+        )
+        self.latency = self.stream.get_output_latency()
+
+    def load(self, path):
+        """Decode a prompt into the cache (done for every prompt at startup)"""
+        if path not in self.cache:
+            self.cache[path] = decode_wav(path, self.sample_rate, self.channels)
+        return self.cache[path]
+
+    def play(self, path, block=True):
+        """Queue a prompt; waits until it has been heard if block, else returns its Playback"""
+        samples = self.load(path)
+        playback = Playback(path, len(samples) / self.sample_rate, samples)
+        with self._lock:
+            self.queue.append(playback)
+        if block:
+            playback.wait()
+        return playback
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if frame_count != len(self._out):
+            self._out = np.zeros((frame_count, self.channels), dtype=np.int16)
+        out = self._out
+        # Time at which the first frame of this block reaches the DAC
+        lead = time_info['output_buffer_dac_time'] - time_info['current_time']
+        dac_time = time.monotonic() + (lead if 0 < lead < 1 else self.latency)
+
+        filled = 0
+        with self._lock:
+            while filled < frame_count and self.queue:
+                playback = self.queue[0]
+                if playback.start is None:
+                    playback.start = dac_time + filled / self.sample_rate
+                n = min(frame_count - filled, len(playback.samples) - playback.position)
+                out[filled:filled + n] = playback.samples[playback.position:playback.position + n]
+                playback.position += n
+                filled += n
+                if playback.position >= len(playback.samples):
+                    playback.end = dac_time + filled / self.sample_rate
+                    playback._handed_over.set()
+                    self.history.append(playback)
+                    self.queue.pop(0)
+        out[filled:] = 0
+        return out.tobytes(), pyaudio.paContinue
+
+    def stats(self):
+        """Mean and max time to first sample in seconds over the prompts played"""
+        delays = [p.time_to_first_sample for p in self.history]
+        return (float(np.mean(delays)), float(np.max(delays))) if delays else (float('nan'), float('nan'))
+
+    def close(self):
+        if self.history:
+            mean, worst = self.stats()
+            logger.info(f"Prompt player: {len(self.history)} prompt(s), time to first sample "
+                        f"{mean * 1000:.0f} ms mean / {worst * 1000:.0f} ms max")
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio_instance.terminate()
+        with self._lock:
+            for playback in self.queue:
+                playback.end = time.monotonic()
+                playback._handed_over.set()
+            self.queue = []
+
+
+def get_player():
+    """Shared prompt player, opened once with every prompt cached; None if unavailable"""
+    global _player, _player_failed
+    if _player is None and not _player_failed:
+        try:
+            _player = PromptPlayer([os.path.join(PROMPT_DIR, name) for name in PROMPTS])
+        except (ImportError, IOError, ValueError) as e:
+            logger.warning(f"Prompt player unavailable ({e}), falling back to aplay")
+            _player_failed = True
+    return _player
+
+
+def close_player():
+    global _player
+    if _player is not None:
+        _player.close()
+        _player = None
+
+
+def _reap(process, playback):
+    """Wait for a non-blocking aplay, so it does not linger as a zombie, and stamp its end"""
+    process.wait()
+    playback.end = time.monotonic()
+    playback._handed_over.set()
+
+
+def sounding(start, stop, tail=ECHO_TAIL):
+    """Whether one of our prompts was sounding between two time.monotonic() stamps"""
+    for playback in list(_timeline):
+        if playback.start is None:
+            continue  # Queued, not heard yet
+        end = math.inf if playback.end is None else playback.end
+        if playback.start < stop and end + tail > start:
+            return True
+    return False
+
+
+def play_wav(path, block=True):
+    """Play a WAV prompt; returns its Playback, whose start and end stamps feed sounding()"""
+    player = get_player()
+    if player is not None:
+        try:
+            playback = player.play(path, block=False)
+        except (OSError, ValueError, wave.Error) as e:
+            logger.warning(f"Could not play {path} from memory ({e}), using aplay")
+        else:
+            _timeline.append(playback)
+            if block:
+                playback.wait()
+            return playback
 
-def play_wav(path):
-    subprocess.run(["aplay", "-q", "-D", AUDIO_DEVICE, path])
+    try:
+        with wave.open(path, 'rb') as wf:
+            duration = wf.getnframes() / wf.getframerate()
+    except (OSError, wave.Error):
+        duration = 0.0
+    # aplay gives no timing, so assume the prompt sounds from now until well after it should end
+    playback = Playback(path, duration)
+    playback.start = playback.requested
+    playback.end = playback.start + APLAY_DELAY + duration
+    _timeline.append(playback)
+    try:
+        command = ["aplay", "-q", "-D", AUDIO_DEVICE, path]
+        if block:
+            subprocess.run(command)
+        else:
+            process = subprocess.Popen(command)
+            threading.Thread(target=_reap, args=(process, playback), daemon=True).start()
+            return playback
+    except FileNotFoundError:
+        logger.warning(f"aplay not found, not playing {path}")
+        playback.end = playback.start
+    else:
+        playback.end = time.monotonic()
+    playback._handed_over.set()
+    return playback
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Replay labeled recordings through the detector detect() runs, as fast as possible.
+
+    python replay.py DIR [THRESHOLD] [--seed CALIBRATION.json]
+
+DIR holds 16-bit WAV files at the service sample rate and a labels.csv with
+`file,onset` rows, where onset is the second the tone starts at (left empty
+for recordings without a tone; files missing from labels.csv count as such).
+Multi-channel files are read on the channel the service detects on.
+THRESHOLD is only needed when the CFAR stage is disabled (MIN_SNR_DB = None).
+
+The service's CFAR is seeded from the calibration and kept warm; pass the
+calibration cache with --seed to do the same. Without it every file starts
+with a cold CFAR, and files labeled with an onset inside its warm-up are
+skipped since the service would never see such a tone.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import wave
+import logging
+import numpy as np
+from calibrate_and_detect import (SAMPLE_RATE, TARGET_FREQS, DETECT_CHANNEL, MIN_SNR_DB, CHUNK_SIZE, HOP_SIZE,
+                                  make_cfar, make_detector)
+
+BLOCK_SECONDS = 1.0    # Audio fed to the detector per call
+ONSET_TOLERANCE = 0.1  # Seconds a detection may precede the labeled onset (label accuracy)
+
+logger = logging.getLogger(__name__)
+
+
+def read_labels(directory):
+    labels = {}
+    path = os.path.join(directory, "labels.csv")
+    if os.path.exists(path):
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith("#") or row[0] == "file":
+                    continue
+                onset = row[1].strip() if len(row) > 1 else ""
+                labels[row[0].strip()] = float(onset) if onset else None
+    return labels
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2 or wf.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"need 16-bit audio at {SAMPLE_RATE} Hz")
+        channels = wf.getnchannels()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype='<i2').reshape(-1, channels)
+    return samples[:, DETECT_CHANNEL if channels > DETECT_CHANNEL else 0]
+
+
+def cfar_warmup():
+    """Seconds an unseeded CFAR needs before it can flag a hop"""
+    cfar = make_cfar()
+    return ((cfar.reference_size // 4 + cfar.guard_size) * HOP_SIZE + CHUNK_SIZE) / SAMPLE_RATE
+
+
+def replay(samples, threshold, seed=None):
+    """Time (s) of the first detection in samples, or None, like one detect() call"""
+    detector = make_detector(threshold, cfar=make_cfar(seed) if MIN_SNR_DB is not None else None)
+    block = int(BLOCK_SECONDS * SAMPLE_RATE)
+    for start in range(0, len(samples), block):
+        if detector.feed(samples[start:start + block]):
+            return detector.decisions[0][1] / SAMPLE_RATE
+    return None
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    args = sys.argv[1:]
+    seed = None
+    if "--seed" in args:
+        i = args.index("--seed")
+        with open(args[i + 1]) as f:
+            seed = json.load(f)["noise_mean"]
+        del args[i:i + 2]
+    directory = args[0]
+    threshold = float(args[1]) if len(args) > 1 else np.inf
+    if MIN_SNR_DB is None and len(args) < 2:
+        logger.error("CFAR is disabled, pass the calibrated THRESHOLD")
+        sys.exit(1)
+
+    warmup = cfar_warmup() if MIN_SNR_DB is not None and seed is None else 0.0
+    if warmup:
+        logger.warning(f"CFAR not seeded (--seed), skipping files with an onset in the first {warmup:.2f} s")
+
+    labels = read_labels(directory)
+    files = tp = fp = fn = tn = skipped = 0
+    latencies = []
+    audio_seconds = cpu_seconds = 0.0
+
+    for name in sorted(f for f in os.listdir(directory) if f.lower().endswith(".wav")):
+        try:
+            samples = read_wav(os.path.join(directory, name))
+        except (OSError, ValueError, wave.Error) as e:
+            logger.warning(f"Skipping {name}: {e}")
+            continue
+
+        onset = labels.get(name)
+        if onset is not None and onset < warmup:
+            logger.warning(f"{name:<32} skipped, onset {onset:.2f} s is inside the CFAR warm-up")
+            skipped += 1
+            continue
+        files += 1
+        start = time.process_time()
+        decision = replay(samples, threshold, seed)
+        cpu_seconds += time.process_time() - start
+        audio_seconds += len(samples) / SAMPLE_RATE
+
+        if decision is not None and onset is not None and decision >= onset - ONSET_TOLERANCE:
+            tp += 1
+            latencies.append(decision - onset)
+            outcome = f"hit, latency {(decision - onset) * 1000:.0f} ms"
+        elif decision is not None:
+            fp += 1
+            fn += onset is not None
+            outcome = f"false alarm at {decision:.2f} s"
+        elif onset is not None:
+            fn += 1
+            outcome = "missed"
+        else:
+            tn += 1
+            outcome = "correctly silent"
+        logger.info(f"{name:<32} {outcome}")
+
+    precision = tp / (tp + fp) if tp + fp else float('nan')
+    recall = tp / (tp + fn) if tp + fn else float('nan')
+    logger.info(f"\n📊 {files} files for {TARGET_FREQS} Hz: "
+                f"TP {tp}, FP {fp}, FN {fn}, TN {tn}" + (f", {skipped} skipped" if skipped else ""))
+    logger.info(f"Precision {precision:.3f}, recall {recall:.3f}")
+    if latencies:
+        latencies = np.array(latencies) * 1000
+        logger.info(f"Latency: mean {latencies.mean():.0f} ms, median {np.median(latencies):.0f} ms, "
+                    f"p90 {np.percentile(latencies, 90):.0f} ms")
+    if cpu_seconds > 0:
+        logger.info(f"Throughput: {audio_seconds / cpu_seconds:.0f} audio-seconds per CPU-second "
+                    f"({audio_seconds:.1f} s of audio)")
+
+
+if __name__ == "__main__":
+    main()
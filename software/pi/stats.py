@@ -0,0 +1,93 @@
+import numpy as np
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile of several series with the P² algorithm.
+
+    Five markers per series track the minimum, p/2, p, (1+p)/2 quantiles and
+    the maximum, and are nudged with a parabolic fit as values come in, so
+    the memory is constant however long the stream is (Jain & Chlamtac, 1985).
+    """
+
+    def __init__(self, p, n_series=1):
+        self.p = p
+        self.count = 0
+        self._heights = np.zeros((5, n_series))
+        self._positions = np.tile(np.arange(1.0, 6.0)[:, None], (1, n_series))
+        self._desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])[:, None] * np.ones(n_series)
+        self._increments = np.array([0, p / 2, p, (1 + p) / 2, 1])[:, None]
+
+    def update(self, values):
+        """Add one value per series"""
+        x = np.asarray(values, dtype=np.float64)
+        q, n = self._heights, self._positions
+        if self.count < 5:
+            q[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                q.sort(axis=0)
+            return
+        self.count += 1
+
+        # Cell of each value, extending the extreme markers if needed
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        k = np.clip((x[None, :] >= q[1:4]).sum(axis=0), 0, 3)
+        n += np.arange(5)[:, None] > k[None, :]
+        self._desired += self._increments
+
+        cols = np.arange(q.shape[1])
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | ((d <= -1) & (n[i - 1] - n[i] < -1))
+            if not move.any():
+                continue
+            s = np.sign(d)
+            # Piecewise-parabolic prediction of the marker height
+            parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            j = np.where(s < 0, i - 1, i + 1)
+            linear = q[i] + s * (q[j, cols] - q[i]) / (n[j, cols] - n[i])
+            ok = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(ok, parabolic, linear), q[i])
+            n[i] = np.where(move, n[i] + s, n[i])
+
+    @property
+    def value(self):
+        if self.count >= 5:
+            return self._heights[2].copy()
+        if not self.count:
+            return np.full(self._heights.shape[1], np.nan)
+        return np.quantile(self._heights[:self.count], self.p, axis=0)
+
+
+class RunningStats:
+    """Constant-memory per-series statistics: Welford mean/variance, extremes and quantiles"""
+
+    def __init__(self, n_series=1, quantiles=()):
+        self.count = 0
+        self.mean = np.zeros(n_series)
+        self._m2 = np.zeros(n_series)
+        self.min = np.full(n_series, np.inf)
+        self.max = np.full(n_series, -np.inf)
+        self.quantiles = {p: P2Quantile(p, n_series) for p in quantiles}
+
+    def update(self, values):
+        """Add one value per series"""
+        x = np.asarray(values, dtype=np.float64)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        np.minimum(self.min, x, out=self.min)
+        np.maximum(self.max, x, out=self.max)
+        for estimator in self.quantiles.values():
+            estimator.update(x)
+
+    @property
+    def std(self):
+        return np.sqrt(self._m2 / max(self.count - 1, 1))
+
+    def quantile(self, p):
+        return self.quantiles[p].value
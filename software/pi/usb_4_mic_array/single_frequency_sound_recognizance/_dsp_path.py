@@ -0,0 +1,5 @@
+"""Put software/pi on sys.path, so these scripts share its dsp module; import it before dsp"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
@@ -1,11 +1,12 @@
 import sys
 import struct
-import math
 import time
 # import numpy as np
 # import sounddevice as sd
 import RPi.GPIO as GPIO
 
+import _dsp_path  # noqa: F401  (software/pi on sys.path)
+from dsp import goertzel, goertzel_table
 
 # Constants
 SAMPLE_RATE = 8000     # 8 kHz
@@ -19,11 +20,8 @@ BUZZER_PIN = 18  # Replace with the GPIO pin connected to the buzzer
 GPIO.setmode(GPIO.BCM)
 GPIO.setup(BUZZER_PIN, GPIO.OUT)
 
-# Pre-compute Goertzel constants
-k = int(0.5 + ((CHUNK_SIZE * TARGET_FREQ) / SAMPLE_RATE))
-omega = (2.0 * math.pi * k) / CHUNK_SIZE
-cosine = math.cos(omega)
-coeff = 2.0 * cosine
+# Pre-compute Goertzel table (shared with the robot service in software/pi)
+GOERTZEL_TABLE = goertzel_table(TARGET_FREQ, CHUNK_SIZE, SAMPLE_RATE)
 
 # Function to generate and play a "bip" sound
 def play_bip_with_speaker(frequency=1000, duration=0.2, repeat=2, pause=0.2):
@@ -43,17 +41,6 @@ def play_bip_with_buzzer(duration=0.2, repeat=2, pause=0.2):
         GPIO.output(BUZZER_PIN, GPIO.LOW)  # Turn off the buzzer
         time.sleep(pause)  
 
-# Goertzel algorithm
-def goertzel(samples):
-    s_prev = 0.0
-    s_prev2 = 0.0
-    for sample in samples:
-        s = sample + coeff * s_prev - s_prev2
-        s_prev2 = s_prev
-        s_prev = s
-    power = s_prev2**2 + s_prev**2 - coeff * s_prev * s_prev2
-    return power
-
 # Function to read a chunk of audio data
 def read_chunk():
     data = sys.stdin.buffer.read(CHUNK_SIZE * 2)  # 2 bytes per sample
@@ -79,7 +66,7 @@ def measure_phase(prompt):
         samples = read_chunk()
         if samples is None:
             break
-        energy = goertzel(samples)
+        energy = goertzel(samples, GOERTZEL_TABLE)
         energies.append(energy)
         print('.', end='', flush=True)
 
@@ -123,6 +110,6 @@ while True:
     if samples is None:
         break
 
-    energy = goertzel(samples)
+    energy = goertzel(samples, GOERTZEL_TABLE)
     if energy > THRESHOLD:
         print(f"Detected {TARGET_FREQ} Hz! Energy = {int(energy)}")
\ No newline at end of file
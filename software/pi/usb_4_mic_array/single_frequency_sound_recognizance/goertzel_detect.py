@@ -1,6 +1,8 @@
 import sys
 import struct
-import math
+
+import _dsp_path  # noqa: F401  (software/pi on sys.path)
+from dsp import goertzel, goertzel_table
 
 SAMPLE_RATE = 8000     # 8 kHz
 CHUNK_SIZE = 205       # ~25ms at 8kHz (tweakable)
@@ -8,22 +10,8 @@ TARGET_FREQ = 1000     # Frequency to detect (Hz)
 # THRESHOLD = 1000000    # Energy threshold (tweak based on environment)
 THRESHOLD = 14552392
 
-# Pre-compute Goertzel constants
-k = int(0.5 + ((CHUNK_SIZE * TARGET_FREQ) / SAMPLE_RATE))
-omega = (2.0 * math.pi * k) / CHUNK_SIZE
-sine = math.sin(omega)
-cosine = math.cos(omega)
-coeff = 2.0 * cosine
-
-def goertzel(samples):
-    s_prev = 0.0
-    s_prev2 = 0.0
-    for sample in samples:
-        s = sample + coeff * s_prev - s_prev2
-        s_prev2 = s_prev
-        s_prev = s
-    power = s_prev2**2 + s_prev**2 - coeff * s_prev * s_prev2
-    return power
+# Pre-compute Goertzel table (shared with the robot service in software/pi)
+GOERTZEL_TABLE = goertzel_table(TARGET_FREQ, CHUNK_SIZE, SAMPLE_RATE)
 
 def read_chunk():
     data = sys.stdin.buffer.read(CHUNK_SIZE * 2)  # 2 bytes per sample
@@ -36,7 +24,7 @@ while True:
     if samples is None:
         break
 
-    energy = goertzel(samples)
+    energy = goertzel(samples, GOERTZEL_TABLE)
     # print(f"Energy: {int(energy)}")
 
     if energy > THRESHOLD:
@@ -1,29 +1,16 @@
 import wave
-import struct
-import math
 import numpy as np
 
+import _dsp_path  # noqa: F401  (software/pi on sys.path)
+from dsp import goertzel_powers, goertzel_table
+
 SAMPLE_RATE = 8000     # 8 kHz
 CHUNK_SIZE = 205       # ~25ms at 8kHz
 TARGET_FREQ = 1000     # Frequency to detect (Hz)
 THRESHOLD = 14552392   # Adjust as needed
 
-# Goertzel constants
-k = int(0.5 + ((CHUNK_SIZE * TARGET_FREQ) / SAMPLE_RATE))
-omega = (2.0 * math.pi * k) / CHUNK_SIZE
-sine = math.sin(omega)
-cosine = math.cos(omega)
-coeff = 2.0 * cosine
-
-def goertzel(samples):
-    s_prev = 0.0
-    s_prev2 = 0.0
-    for sample in samples:
-        s = sample + coeff * s_prev - s_prev2
-        s_prev2 = s_prev
-        s_prev = s
-    power = s_prev2**2 + s_prev**2 - coeff * s_prev * s_prev2
-    return power
+# Pre-compute Goertzel table (shared with the robot service in software/pi)
+GOERTZEL_TABLE = goertzel_table(TARGET_FREQ, CHUNK_SIZE, SAMPLE_RATE)
 
 def process_audio_file(filename):
     with wave.open(filename, 'rb') as wf:
@@ -34,9 +21,10 @@ def process_audio_file(filename):
         frames = wf.readframes(wf.getnframes())
         samples = np.frombuffer(frames, dtype=np.int16)
 
-        for i in range(0, len(samples) - CHUNK_SIZE + 1, CHUNK_SIZE):
-            chunk = samples[i:i+CHUNK_SIZE]
-            energy = goertzel(chunk)
+        # Evaluate every full chunk of the file in one call
+        n_chunks = len(samples) // CHUNK_SIZE
+        chunks = samples[:n_chunks * CHUNK_SIZE].reshape(n_chunks, CHUNK_SIZE)
+        for energy in goertzel_powers(chunks, GOERTZEL_TABLE):
             if energy > THRESHOLD:
                 print(f"Detected {TARGET_FREQ} Hz! Energy = {int(energy)}")
 
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+"""
+Bounded queue with a drop policy and per-stage counters, for the test pipelines
+"""
+
+import threading
+import time
+from collections import deque
+
+DROP_OLDEST = 'drop_oldest'   # keep the freshest audio (real-time stages)
+DROP_NEWEST = 'drop_newest'   # keep what is queued, refuse new items
+BLOCK = 'block'               # backpressure: the producer waits for room
+
+
+class BoundedQueue(object):
+    def __init__(self, maxsize=8, policy=DROP_OLDEST, name=''):
+        if policy not in (DROP_OLDEST, DROP_NEWEST, BLOCK):
+            raise ValueError('Unknown drop policy {}'.format(policy))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        self.items = deque()
+        self.cond = threading.Condition()
+
+        self.put_count = 0
+        self.get_count = 0
+        self.drops = 0
+        self.max_depth = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def put(self, data, timeout=None):
+        """Queue data; returns False if it (or the oldest item) was dropped"""
+        with self.cond:
+            self.put_count += 1
+            dropped = False
+            if len(self.items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    self.drops += 1
+                    return False
+                elif self.policy == DROP_OLDEST:
+                    self.items.popleft()
+                    self.drops += 1
+                    dropped = True
+                elif not self.cond.wait_for(lambda: len(self.items) < self.maxsize, timeout):
+                    self.drops += 1
+                    return False
+
+            self.items.append((time.monotonic(), data))
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.cond.notify_all()
+            return not dropped
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None after timeout"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.items, timeout):
+                return None
+            queued_at, data = self.items.popleft()
+            self.cond.notify_all()
+
+            latency = time.monotonic() - queued_at
+            self.get_count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            return data
+
+    def stats(self):
+        with self.cond:
+            return {
+                'depth': len(self.items),
+                'max_depth': self.max_depth,
+                'put': self.put_count,
+                'drops': self.drops,
+                'mean_latency': self.total_latency / self.get_count if self.get_count else 0.0,
+                'max_latency': self.max_latency,
+            }
+
+    def __str__(self):
+        s = self.stats()
+        return '{:10} depth {}/{} (max {}), {} put, {} dropped, latency {:.1f} ms mean / {:.1f} ms max'.format(
+            self.name, s['depth'], self.maxsize, s['max_depth'], s['put'], s['drops'],
+            s['mean_latency'] * 1000, s['max_latency'] * 1000)
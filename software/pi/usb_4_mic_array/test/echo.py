@@ -2,10 +2,6 @@
 
 import threading
 import sys
-if sys.version_info[0] < 3:
-    import Queue as queue
-else:
-    import queue
 
 import numpy as np
 import audioop
@@ -15,6 +11,7 @@ from voice_engine.element import Element
 from voice_engine.file_sink import FileSink
 from kws import KWS
 from player import Player
+from bounded_queue import BoundedQueue, DROP_OLDEST
 
 
 class Source(Element):
@@ -64,7 +61,7 @@ class Source(Element):
 
 
 class Route(Element):
-    def __init__(self):
+    def __init__(self, maxsize=8, policy=DROP_OLDEST):
         super(Route, self).__init__()
 
         self.channels = 6
@@ -79,12 +76,12 @@ class Route(Element):
 
                 return on_detected
 
-            kws = KWS()
+            kws = KWS(maxsize, policy, 'kws {}'.format(ch))
             self.kws_list.append(kws)
             kws.on_detected = callback_gen(ch)
             kws.start()
 
-        self.queue = queue.Queue()
+        self.queue = BoundedQueue(maxsize, policy, 'route')
         self.done = True
 
     def put(self, data):
@@ -107,14 +104,20 @@ class Route(Element):
 
     def run(self):
         while not self.done:
-            data = self.queue.get()
-            data = np.fromstring(data, dtype='int16')
-
-            rms_data = []
-            rms_data_db = []
+            data = self.queue.get(timeout=0.5)
+            if data is None:
+                continue
+
+            # Interleaved bytes -> (frames, channels) view, no copy
+            frames = np.frombuffer(data, dtype='int16').reshape(-1, self.channels)
+            # One deinterleave for all channels; each row is then a contiguous view,
+            # handed over as bytes since Decoder.process_raw() takes a byte buffer
+            planar = np.ascontiguousarray(frames.T)
             for ch in range(self.channels):
-                mono = data[ch::self.channels]
-                self.kws_list[ch].put(mono.tostring())
+                self.kws_list[ch].put(memoryview(planar[ch]).cast('B'))
+
+    def stats(self):
+        return [self.queue] + [kws.queue for kws in self.kws_list]
 
 
 def main():
@@ -148,6 +151,9 @@ def main():
 
     src.pipeline_stop()
 
+    for stage in route.stats():
+        print(stage)
+
     if route.detect_mask != 0b111111:
         print('Not all channels detected')
 
@@ -7,19 +7,15 @@ Keyword spotting using pocketsphinx
 import os
 import threading
 
-try:
-    import Queue as queue
-except ImportError:
-    import queue
-
 from voice_engine.element import Element
 from pocketsphinx.pocketsphinx import Decoder
+from bounded_queue import BoundedQueue, DROP_OLDEST
 
 class KWS(Element):
-    def __init__(self):
+    def __init__(self, maxsize=8, policy=DROP_OLDEST, name='kws'):
         super(KWS, self).__init__()
 
-        self.queue = queue.Queue()
+        self.queue = BoundedQueue(maxsize, policy, name)
         self.on_detected = None
         self.done = False
 
@@ -58,7 +54,9 @@ class KWS(Element):
         decoder.start_utt()
 
         while not self.done:
-            data = self.queue.get()
+            data = self.queue.get(timeout=0.5)
+            if data is None:
+                continue
             decoder.process_raw(data, False, False)
             hypothesis = decoder.hyp()
             if hypothesis:
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+All-channel RMS / peak / dBFS metering element
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from voice_engine.element import Element
+from bounded_queue import BoundedQueue, DROP_OLDEST
+
+FULL_SCALE = 32768.0
+FLOOR_DB = -120.0
+
+
+def levels(frames):
+    """RMS, peak and RMS in dBFS of each column of an int16 (frames, channels) array"""
+    energy = np.einsum('ij,ij->j', frames, frames, dtype=np.int64, casting='unsafe')
+    rms = np.sqrt(energy / float(len(frames)))
+    peak = np.maximum(frames.max(axis=0).astype(np.int32), -frames.min(axis=0).astype(np.int32))
+    db = 20 * np.log10(np.maximum(rms / FULL_SCALE, 10 ** (FLOOR_DB / 20)))
+    return rms, peak, db
+
+
+class Meter(Element):
+    """
+    Measures every buffer going through it and keeps the last `history` results
+    in a ring buffer; subscribers are called with (timestamp, rms, peak, db)
+    """
+
+    def __init__(self, channels=6, channels_mask=None, history=600, maxsize=8):
+        super(Meter, self).__init__()
+
+        self.channels = channels
+        self.channels_mask = list(channels_mask) if channels_mask is not None else list(range(channels))
+
+        n = len(self.channels_mask)
+        self.times = np.zeros(history)
+        self.rms = np.zeros((history, n))
+        self.peak = np.zeros((history, n), dtype=np.int32)
+        self.db = np.full((history, n), FLOOR_DB)
+        self.count = 0
+        self.lock = threading.Lock()
+        self.subscribers = []
+
+        self.queue = BoundedQueue(maxsize, DROP_OLDEST, 'meter')
+        self.done = True
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def put(self, data):
+        self.queue.put(data)
+
+    def start(self):
+        self.done = False
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.done = True
+
+    def latest(self, n=1):
+        """(times, rms, peak, db) of the last n buffers, oldest first"""
+        with self.lock:
+            n = min(n, self.count, len(self.times))
+            index = np.arange(self.count - n, self.count) % len(self.times)
+            return self.times[index], self.rms[index], self.peak[index], self.db[index]
+
+    def run(self):
+        while not self.done:
+            data = self.queue.get(timeout=0.5)
+            if data is None:
+                continue
+
+            # Measure all channels on the interleaved view, then keep the masked ones
+            frames = np.frombuffer(data, dtype='int16').reshape(-1, self.channels)
+            rms, peak, db = (x[self.channels_mask] for x in levels(frames))
+            now = time.time()
+
+            with self.lock:
+                i = self.count % len(self.times)
+                self.times[i] = now
+                self.rms[i] = rms
+                self.peak[i] = peak
+                self.db[i] = db
+                self.count += 1
+
+            for callback in self.subscribers:
+                callback(now, rms, peak, db)
+
+            super(Meter, self).put(data)
@@ -1,18 +1,12 @@
 
 
-import threading
-import sys
-if sys.version_info[0] < 3:
-    import Queue as queue
-else:
-    import queue
-
 import numpy as np
 import audioop
 import pyaudio
 
 from voice_engine.element import Element
 from voice_engine.file_sink import FileSink
+from meter import Meter
 
 
 class Source(Element):
@@ -61,58 +55,12 @@ class Source(Element):
         self.stream.stop_stream()
 
 
-class RMS(Element):
-    def __init__(self):
-        super(RMS, self).__init__()
-
-        self.channels = 6
-        self.channels_mask = [1, 2, 3, 4]
-
-        self.queue = queue.Queue()
-        self.done = True
-
-    def put(self, data):
-        self.queue.put(data)
-
-    def start(self):
-        self.done = False
-        thread = threading.Thread(target=self.run)
-        thread.daemon = True
-        thread.start()
-
-    def stop(self):
-        self.done = True
-
-    def on_data(self, data):
-        pass
-
-    def run(self):
-        while not self.done:
-            data = self.queue.get()
-            data = np.fromstring(data, dtype='int16')
-
-            rms_data = []
-            rms_data_db = []
-            for ch in self.channels_mask:
-                mono = data[ch::self.channels]
-                rms = np.sqrt(np.mean(np.square(mono.astype('int32'))))
-                rms_data.append(rms)
-                # rms = 20 * np.log10(rms)
-                # rms_data_db.append(rms)
-            
-            print(rms_data)
-
-            # x = np.fromstring(data, dtype='int16')
-
-            super(RMS, self).put(data)
-
-
 def main():
     import time
     import datetime
 
     src = Source(frames_size=1600)
-    rms = RMS()
+    rms = Meter(src.channels, channels_mask=[1, 2, 3, 4])
 
     # filename = '1.quiet.' + datetime.datetime.now().strftime("%Y%m%d.%H:%M:%S") + '.wav'
     # sink = FileSink(filename, channels=src.channels, rate=src.rate)
@@ -126,6 +74,9 @@ def main():
     while True:
         try:
             time.sleep(1)
+            _, _, peak, db = rms.latest(10)
+            if len(db):
+                print('dBFS {}  peak {}'.format(np.round(db.mean(axis=0), 1), peak.max(axis=0)))
         except KeyboardInterrupt:
             break
 
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
+import os
 import sys
+import csv
+import json
+import time
 import struct
 import usb.core
 import usb.util
@@ -8,10 +12,14 @@ import usb.util
 USAGE = """Usage: python {} -h
         -p      show all parameters
         -r      read all parameters
+        -a PROFILE  apply the named parameter profile from profiles.json
+        -w FILE RATE NAME [NAME ...]
+                watch parameters at RATE Hz into FILE (.csv or .npz) until Ctrl-C
         NAME    get the parameter with the NAME
         NAME VALUE  set the parameter with the NAME and the VALUE
 """
 
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles.json')
 
 
 # parameter list
@@ -61,6 +69,19 @@ PARAMETERS = {
 }
 
 
+def _read_command(name):
+    """(id, cmd, is_int) of the control transfer reading NAME"""
+    data = PARAMETERS[name]
+    cmd = 0x80 | data[1]
+    if data[2] == 'int':
+        cmd |= 0x40
+    return data[0], cmd, data[2] == 'int'
+
+
+# Decode metadata of every parameter, computed once instead of on every read
+READ_COMMANDS = {name: _read_command(name) for name in PARAMETERS}
+
+
 class Tuning:
     TIMEOUT = 100000
 
@@ -90,30 +111,87 @@ class Tuning:
 
     def read(self, name):
         try:
-            data = PARAMETERS[name]
+            id, cmd, is_int = READ_COMMANDS[name]
         except KeyError:
             return
 
-        id = data[0]
-
-        cmd = 0x80 | data[1]
-        if data[2] == 'int':
-            cmd |= 0x40
-
-        length = 8
+        return self._read(id, cmd, is_int)
 
+    def _read(self, id, cmd, is_int):
         response = self.dev.ctrl_transfer(
             usb.util.CTRL_IN | usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE,
-            0, cmd, id, length, self.TIMEOUT)
+            0, cmd, id, 8, self.TIMEOUT)
 
-        response = struct.unpack(b'ii', response.tostring())
+        mantissa, exponent = struct.unpack(b'ii', response.tobytes())
 
-        if data[2] == 'int':
-            result = response[0]
-        else:
-            result = response[0] * (2.**response[1])
+        if is_int:
+            return mantissa
+        return mantissa * (2. ** exponent)
+
+    def snapshot(self, names=None):
+        """Read several parameters (all by default) in one pass, as a {name: value} dict"""
+        commands = [(name, READ_COMMANDS[name]) for name in (sorted(PARAMETERS) if names is None else names)]
+        return {name: self._read(*command) for name, command in commands}
+
+    def watch(self, names, rate, path, duration=None):
+        """Poll NAMES at RATE Hz into a .csv or .npz file; return the achieved rate.
 
-        return result
+        Runs for DURATION seconds, or until interrupted with Ctrl-C.
+        """
+        commands = [READ_COMMANDS[name] for name in names]
+        period = 1.0 / rate
+        rows = []
+        start = next_poll = time.monotonic()
+        try:
+            while duration is None or time.monotonic() - start < duration:
+                stamp = time.monotonic()
+                rows.append([stamp - start] + [self._read(*command) for command in commands])
+                # Keep the schedule; if a poll overran, skip ahead instead of bursting
+                next_poll = max(next_poll + period, time.monotonic())
+                time.sleep(max(0.0, next_poll - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.monotonic() - start
+        achieved = len(rows) / elapsed if elapsed > 0 else 0.0
+        if path.endswith('.npz'):
+            import numpy as np
+            np.savez(path, names=list(names), time=[row[0] for row in rows],
+                     values=[row[1:] for row in rows], rate=achieved)
+        else:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['time'] + list(names))
+                writer.writerows(rows)
+        return achieved
+
+    def apply(self, values, rel_tol=1e-3):
+        """Bring parameters to VALUES, writing only those that differ, then verify.
+
+        Returns the list of names that were written. Raises ValueError if a
+        parameter still differs after writing (floats are compared with
+        REL_TOL, as the device stores them with limited precision).
+        """
+        def same(name, current, target):
+            if PARAMETERS[name][2] == 'int':
+                return int(current) == int(target)
+            return abs(current - target) <= rel_tol * max(abs(target), 1e-9)
+
+        current = self.snapshot(values.keys())
+        changed = [name for name, value in values.items() if not same(name, current[name], value)]
+        for name in changed:
+            self.write(name, values[name])
+
+        readback = self.snapshot(changed)
+        wrong = [name for name in changed if not same(name, readback[name], values[name])]
+        if wrong:
+            raise ValueError('Could not set {}'.format(
+                ', '.join('{}={} (reads {})'.format(n, values[n], readback[n]) for n in wrong)))
+        return changed
+
+    def apply_profile(self, name, path=PROFILE_FILE):
+        """Apply a named profile of parameter values stored in PATH"""
+        return self.apply(load_profile(name, path))
 
     def set_vad_threshold(self, db):
         self.write('GAMMAVAD_SR', db)
@@ -138,6 +216,20 @@ class Tuning:
         usb.util.dispose_resources(self.dev)
 
 
+def load_profile(name, path=PROFILE_FILE):
+    """{parameter: value} dict of the profile NAME from a JSON file of profiles"""
+    with open(path) as f:
+        profiles = json.load(f)
+    if name not in profiles:
+        raise KeyError('No profile {} in {} (have: {})'.format(name, path, ', '.join(profiles)))
+
+    values = profiles[name]
+    for param in values:
+        if param not in PARAMETERS or PARAMETERS[param][5] == 'ro':
+            raise ValueError('{} in profile {} is not a writable parameter'.format(param, name))
+    return values
+
+
 def find(vid=0x2886, pid=0x0018):
     dev = usb.core.find(idVendor=vid, idProduct=pid)
     if not dev:
@@ -177,8 +269,23 @@ def main():
             if sys.argv[1] == '-r':
                 print('{:24} {}'.format('name', 'value'))
                 print('-------------------------------')
-                for name in sorted(PARAMETERS.keys()):
-                    print('{:24} {}'.format(name, dev.read(name)))
+                for name, value in dev.snapshot().items():
+                    print('{:24} {}'.format(name, value))
+            elif sys.argv[1] == '-a':
+                start = time.monotonic()
+                changed = dev.apply_profile(sys.argv[2])
+                print('Profile {} applied in {:.1f} ms, changed: {}'.format(
+                    sys.argv[2], (time.monotonic() - start) * 1000, ', '.join(changed) or 'nothing'))
+            elif sys.argv[1] == '-w':
+                path, rate = sys.argv[2], float(sys.argv[3])
+                names = [name.upper() for name in sys.argv[4:]]
+                unknown = [name for name in names if name not in PARAMETERS]
+                if unknown or not names:
+                    print('Invalid parameter names: {}'.format(' '.join(unknown) or '(none)'))
+                    sys.exit(1)
+                print('Watching {} at {} Hz into {}, Ctrl-C to stop'.format(', '.join(names), rate, path))
+                achieved = dev.watch(names, rate, path)
+                print('Achieved {:.1f} Hz ({:.0f} reads/s)'.format(achieved, achieved * len(names)))
             else:
                 name = sys.argv[1].upper()
                 if name in PARAMETERS: